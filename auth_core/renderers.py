@@ -0,0 +1,62 @@
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack responses are unavailable
+    msgpack = None
+
+_encoder = JSONEncoder()
+LINE_SEPARATOR = "\u2028".encode()
+PARAGRAPH_SEPARATOR = "\u2029".encode()
+
+
+def encode_default(obj):
+    """ Types the fast encoders do not know, converted the same way DRF's JSONEncoder does. """
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson, which encodes dicts, lists, numbers
+    and UUIDs in C. Datetimes, Decimals and anything else go through
+    DRF's encoder, and U+2028/U+2029 are escaped like the stock renderer
+    does. Floats are written in orjson's shortest form, so they can differ
+    textually from the stock output (same values, e.g. 1e+16 vs 1e16).
+    Indented (browsable) output and installs without orjson use the stock
+    renderer.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if orjson is None or self.get_indent(accepted_media_type or "", renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        content = orjson.dumps(data, default=encode_default, option=self.options)
+        # Valid JSON but not valid JavaScript, escaped as the stock renderer does
+        return content.replace(LINE_SEPARATOR, b"\\u2028").replace(PARAGRAPH_SEPARATOR, b"\\u2029")
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Opt-in `application/msgpack` responses, selected with the Accept header.
+    Only listed in DEFAULT_RENDERER_CLASSES when msgpack is installed.
+    """
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if msgpack is None:
+            raise ImproperlyConfigured("MessagePackRenderer requires the msgpack package.")
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
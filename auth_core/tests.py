@@ -3,6 +3,12 @@ from django.utils import timezone
 from datetime import timedelta
 from auth_core.models import APIKey, Application
 from auth_core.throttling import APIKeyRateThrottle
+from auth_core.renderers import FastJSONRenderer, MessagePackRenderer, msgpack
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+from decimal import Decimal
+from unittest import skipUnless
+import uuid
 
 class APIKeyRateThrottleTest(TestCase):
 
@@ -63,3 +69,31 @@ class APIKeyRateThrottleTest(TestCase):
 
         allowed = self.throttle.allow_request(request, None)
         self.assertTrue(allowed)
+
+
+class RendererTest(TestCase):
+
+    def setUp(self):
+        self.data = ReturnDict({
+            "id": 1,
+            "price": Decimal("12.50"),
+            "created_at": timezone.now(),
+            "token": uuid.uuid4(),
+            "rating_counts": {1: 0, 5: 3},
+            "title": "Things Fall Apart \u00e9",
+            "tags": [None, True, 1.5],
+        }, serializer=None)
+
+    def test_fast_json_matches_the_stock_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_indented_output_uses_the_stock_renderer(self):
+        rendered = FastJSONRenderer().render(self.data, "application/json; indent=2")
+        self.assertIn(b"\n  ", rendered)
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_round_trips(self):
+        decoded = msgpack.unpackb(MessagePackRenderer().render(self.data), strict_map_key=False)
+        self.assertEqual(decoded["price"], 12.5)
+        self.assertEqual(decoded["token"], str(self.data["token"]))
+        self.assertEqual(decoded["rating_counts"], {1: 0, 5: 3})
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Author, Category, Publisher, Tag, Product, ProductImage, ProductRating, Discount
+from .models import Author, Category, Publisher, Tag, Product, ProductImage, ProductRating, ProductRatingSummary, Discount, FeaturedProduct
 
 
 @admin.register(Author)
@@ -57,4 +57,20 @@ class BookImageAdmin(admin.ModelAdmin):
 
 @admin.register(ProductRating)
 class ProductRatingAdmin(admin.ModelAdmin):
-    list_display = ("user", "product", "score", "review")
\ No newline at end of file
+    list_display = ("user", "product", "score", "review")
+
+@admin.register(ProductRatingSummary)
+class ProductRatingSummaryAdmin(admin.ModelAdmin):
+    list_display = ("product", "rating_count", "average_rating", "updated_at")
+    readonly_fields = (
+        "product", "rating_count", "rating_sum", "score_1", "score_2",
+        "score_3", "score_4", "score_5", "average_rating",
+    )
+
+
+@admin.register(FeaturedProduct)
+class FeaturedProductAdmin(admin.ModelAdmin):
+    list_display = ("product", "is_pinned", "weight", "is_automatic", "updated_at")
+    list_editable = ("is_pinned", "weight")
+    list_filter = ("is_pinned", "is_automatic")
+    raw_id_fields = ("product",)
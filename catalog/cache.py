@@ -0,0 +1,160 @@
+# cache.py for catalog app
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+VERSION_KEY = "catalog_version:{label}"
+# Entries are (built_at, data) pairs
+RESPONSE_KEY = "catalog_response_entry:{view}:{digest}"
+HITS_KEY = "catalog_cache_hits"
+MISSES_KEY = "catalog_cache_misses"
+
+
+def get_cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def _incr(key, initial=1):
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Counter missing or evicted: start it over
+        if cache.add(key, initial, timeout=None):
+            return initial
+        return cache.incr(key)
+
+
+def _initial_version():
+    # Time based, so a version lost to eviction never matches an older cached response
+    return int(time.time() * 1000)
+
+
+def bump_version(model):
+    """ Invalidate every cached response that depends on `model` in O(1). """
+    return _incr(VERSION_KEY.format(label=_label(model)), initial=_initial_version())
+
+
+def bump_version_on_commit(model):
+    """
+    Bump now and again once the surrounding transaction commits: a miss
+    between the write and its commit reads the old rows and would cache
+    them under the new version.
+    """
+    bump_version(model)
+    transaction.on_commit(lambda: bump_version(model))
+
+
+def invalidate_bulk_writes(*models):
+    """
+    Drop the cached responses of `models` after a write that sends no
+    model signals: bulk_create, queryset update() or delete(), raw SQL
+    and MPTT rebuilds. Every other write is covered by catalog.signals.
+    """
+    for model in models:
+        bump_version_on_commit(model)
+
+
+def get_versions(models):
+    cache = get_cache()
+    keys = [VERSION_KEY.format(label=_label(model)) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_version(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def get_cache_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0,
+    }
+
+
+class CachedResponseMixin:
+    """
+    Cache successful GET responses keyed by endpoint, normalized query
+    parameters and the version counters of `cache_models`. Saving or
+    deleting any of those models bumps its version, so stale entries are
+    never read again and simply expire. The same key is sent as an ETag
+    so clients can revalidate with If-None-Match, and the time the cached
+    payload was built as Last-Modified for If-Modified-Since: as the key
+    covers every version, the payload cannot have changed since then.
+    """
+    cache_models = ()
+    cache_timeout = None
+
+    def get(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, lambda: super(CachedResponseMixin, self).get(request, *args, **kwargs)
+        )
+
+    def get_cached_response(self, request, build_response):
+        cache = get_cache()
+        digest = self.get_response_digest(request)
+        key = RESPONSE_KEY.format(view=self.__class__.__name__, digest=digest)
+
+        # The digest covers every input of the payload, so it doubles as the ETag
+        # and If-None-Match hits return 304 before the payload is read or built
+        etag = f'"{digest}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            patch_vary_headers(not_modified, ["Accept"])
+            return not_modified
+
+        entry = cache.get(key)
+        if entry is not None:
+            _incr(HITS_KEY)
+            last_modified, data = entry
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                patch_vary_headers(not_modified, ["Accept"])
+                return not_modified
+            response = Response(data)
+        else:
+            _incr(MISSES_KEY)
+            last_modified = int(time.time())
+            response = build_response()
+            if response.status_code == 200:
+                timeout = self.cache_timeout or getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 60)
+                cache.set(key, (last_modified, response.data), timeout=timeout)
+
+        if response.status_code == 200:
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            patch_vary_headers(response, ["Accept"])
+        return response
+
+    def get_response_digest(self, request):
+        # Only the names are sorted: repeated values such as order_by keep their order
+        params = sorted(
+            (name, [value for value in request.query_params.getlist(name) if value])
+            for name in request.query_params
+        )
+        signature = json.dumps({
+            "host": request.get_host(),
+            "path": request.path,
+            "kwargs": self.kwargs,
+            "params": [param for param in params if param[1]],
+            # JSON and msgpack bodies of the same data need different ETags
+            "format": getattr(getattr(request, "accepted_renderer", None), "format", None),
+            "versions": get_versions(self.cache_models),
+        }, sort_keys=True, default=str)
+        return hashlib.sha1(signature.encode()).hexdigest()
@@ -0,0 +1,93 @@
+# discounts.py for catalog app
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from django.db.models import Count, Max
+from django.utils import timezone
+from .models import Discount
+
+
+class DiscountIndex:
+    """
+    Discounts that have not ended yet, grouped per product and kept in id
+    order. Resolution checks each discount's [start_date, end_date]
+    interval against the given time, so upcoming discounts switch on
+    without a rebuild; the index only expires once a discount ends, to
+    drop it.
+    """
+
+    def __init__(self, discounts, built_at):
+        self.built_at = built_at
+        self.by_product = defaultdict(list)
+        for discount in sorted(discounts, key=lambda discount: discount.id):
+            self.by_product[discount.product_id].append(discount)
+        ends = [discount.end_date for discount in discounts]
+        # end_date is inclusive, the discount only stops applying right after it
+        self.expires_at = min(ends) + timedelta(microseconds=1) if ends else None
+
+    def is_fresh(self, now):
+        return now >= self.built_at and (self.expires_at is None or now < self.expires_at)
+
+    def resolve(self, product_id, quantity, now):
+        """ The discount a line gets: the lowest id active at `now` whose minimum quantity is met. """
+        for discount in self.by_product.get(product_id, ()):
+            if discount.start_date <= now <= discount.end_date and discount.min_quantity <= quantity:
+                return discount
+        return None
+
+
+_index = None
+_index_signature = None
+_lock = threading.Lock()
+
+
+def discount_table_signature():
+    """
+    Row count, highest id and latest update of the Discount table, read
+    with one aggregate query. Any create, save or delete in any process
+    changes it, whatever cache backend is configured.
+    """
+    return tuple(Discount.objects.aggregate(
+        count=Count("id"), last_id=Max("id"), last_update=Max("updated_on"),
+    ).values())
+
+
+def get_discount_index(now=None):
+    """
+    Return the process-wide discount index, rebuilt with one query when
+    the Discount table signature changed or a discount has ended. The
+    signature is re-read on every call, so prices never follow a stale
+    index, at the cost of one aggregate query per basket.
+    """
+    global _index, _index_signature
+    now = now or timezone.now()
+    signature = discount_table_signature()
+    index = _index
+    if index is not None and _index_signature == signature and index.is_fresh(now):
+        return index
+
+    with _lock:
+        if _index is None or _index_signature != signature or not _index.is_fresh(now):
+            # The signature was read first, so rows committed meanwhile only cause one extra rebuild
+            discounts = list(Discount.objects.filter(end_date__gte=now))
+            _index = DiscountIndex(discounts, now)
+            _index_signature = signature
+        return _index
+
+
+def resolve_discounts(lines, now=None):
+    """
+    Resolve the discount of every (product_id, quantity) line of a basket
+    with a single index lookup. Returns one Discount or None per line, in
+    order, following the same rules as the per-line queries they replace.
+    """
+    now = now or timezone.now()
+    index = get_discount_index(now)
+    return [index.resolve(product_id, quantity, now) for product_id, quantity in lines]
+
+
+def clear_discount_index():
+    global _index, _index_signature
+    with _lock:
+        _index = None
+        _index_signature = None
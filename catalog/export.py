@@ -0,0 +1,112 @@
+# export.py for catalog app
+import csv
+import json
+from django.conf import settings
+from django.db.models import Q
+from .importer import LIST_SEPARATOR
+from .models import Product
+
+EXPORT_FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+}
+# Same column names as the import_catalog feed, so an export can be loaded back
+EXPORT_COLUMNS = [
+    "isbn", "title", "slug", "description", "publication_date", "price", "stock_quantity",
+    "format_type", "physical_stock_status", "ebook_stock_status", "language", "ebook_file_size",
+    "pages", "file_url", "publisher", "authors", "categories", "tags", "main_image",
+    "avg_rating", "rating_count", "updated_at",
+]
+
+
+def export_queryset(updated_since=None):
+    queryset = (
+        Product.objects
+        .filter(status="Publish")
+        .select_related("publisher")
+        .prefetch_related("authors", "categories", "tags")
+        .order_by("updated_at", "id")
+    )
+    if updated_since is not None:
+        queryset = queryset.filter(updated_at__gte=updated_since)
+    return queryset
+
+
+def iter_export_products(updated_since=None, chunk_size=None):
+    """
+    Yield published products in (updated_at, id) order, one keyset chunk
+    at a time with the relations prefetched per chunk. Each chunk is its
+    own short query, so memory stays flat and no cursor is held open
+    between chunks. A book updated during the export moves behind the
+    cursor and is emitted again, never skipped.
+    """
+    chunk_size = chunk_size or getattr(settings, "CATALOG_EXPORT_CHUNK_SIZE", 500)
+    queryset = export_queryset(updated_since)
+    last = None
+    while True:
+        chunk = queryset
+        if last is not None:
+            chunk = chunk.filter(
+                Q(updated_at__gt=last.updated_at) | Q(updated_at=last.updated_at, id__gt=last.id)
+            )
+        products = list(chunk[:chunk_size])
+        yield from products
+        if len(products) < chunk_size:
+            return
+        last = products[-1]
+
+
+def export_row(product, request):
+    return {
+        "isbn": product.isbn,
+        "title": product.title,
+        "slug": product.slug,
+        "description": product.description,
+        "publication_date": product.publication_date.isoformat() if product.publication_date else None,
+        "price": str(product.price),
+        "stock_quantity": product.stock_quantity,
+        "format_type": product.format_type,
+        "physical_stock_status": product.physical_stock_status,
+        "ebook_stock_status": product.ebook_stock_status,
+        "language": product.language,
+        "ebook_file_size": str(product.ebook_file_size) if product.ebook_file_size is not None else None,
+        "pages": product.pages,
+        "file_url": product.file_url,
+        "publisher": product.publisher.name if product.publisher else None,
+        "authors": [author.name for author in product.authors.all()],
+        "categories": [category.name for category in product.categories.all()],
+        "tags": [tag.name for tag in product.tags.all()],
+        "main_image": request.build_absolute_uri(product.main_image.url) if product.main_image else None,
+        "avg_rating": product.avg_rating,
+        "rating_count": product.rating_count,
+        "updated_at": product.updated_at.isoformat(),
+    }
+
+
+class _Echo:
+    """ File-like object whose write() hands the line back to the csv writer's caller. """
+
+    def write(self, value):
+        return value
+
+
+def stream_jsonl(products, request):
+    for product in products:
+        yield json.dumps(export_row(product, request), ensure_ascii=False) + "\n"
+
+
+def stream_csv(products, request):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for product in products:
+        row = export_row(product, request)
+        yield writer.writerow([
+            LIST_SEPARATOR.join(row[column]) if isinstance(row[column], list) else row[column]
+            for column in EXPORT_COLUMNS
+        ])
+
+
+EXPORT_STREAMS = {
+    "jsonl": stream_jsonl,
+    "csv": stream_csv,
+}
@@ -0,0 +1,118 @@
+# featured.py for catalog app
+import random
+from bisect import bisect_right
+from itertools import accumulate
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from .cache import get_cache, get_versions, invalidate_bulk_writes
+from .models import Category, Product, FeaturedProduct
+
+POOL_KEY = "catalog_featured_pool:{versions}"
+# Marks the Product version the automatic entries were last sampled for
+REFRESHED_KEY = "catalog_featured_refreshed:{version}"
+FEATURED_COUNT = 6
+# Weighted draws tried per requested book before falling back to pool order
+DRAWS_PER_PICK = 8
+
+
+def refresh_featured_pool():
+    """
+    Rebuild the automatic part of the featured pool: a random sample of
+    published books from the five categories with the most books. Only
+    ids are loaded, never full product rows.
+    """
+    pool_size = getattr(settings, "FEATURED_POOL_SIZE", 100)
+    top_category_ids = list(
+        Category.objects
+        .annotate(product_count=Count("books"))
+        .order_by("-product_count")
+        .values_list("id", flat=True)[:5]
+    )
+    candidate_ids = list(
+        Product.objects
+        .filter(categories__in=top_category_ids, status="Publish")
+        .order_by()
+        .values_list("id", flat=True)
+        .distinct()
+    )
+    sample = random.sample(candidate_ids, min(pool_size, len(candidate_ids)))
+
+    with transaction.atomic():
+        FeaturedProduct.objects.filter(is_automatic=True).exclude(product_id__in=sample).delete()
+        existing = set(FeaturedProduct.objects.filter(product_id__in=sample).values_list("product_id", flat=True))
+        FeaturedProduct.objects.bulk_create([
+            FeaturedProduct(product_id=product_id, is_automatic=True)
+            for product_id in sample if product_id not in existing
+        ])
+    invalidate_bulk_writes(FeaturedProduct)
+    return len(sample)
+
+
+def get_featured_pool():
+    """
+    Pinned ids plus the unpinned ids and their cumulative weights, cached
+    until a product or pool entry changes. The automatic entries are
+    resampled once per Product version, so new and unpublished books
+    enter and leave the pool without waiting for the cron refresh.
+    """
+    cache = get_cache()
+    timeout = getattr(settings, "FEATURED_POOL_TIMEOUT", 60 * 60)
+    versions = get_versions((Product, FeaturedProduct))
+    key = POOL_KEY.format(versions="-".join(map(str, versions)))
+    pool = cache.get(key)
+    if pool is not None:
+        return pool
+
+    # add() is atomic, so one process resamples per Product version
+    if cache.add(REFRESHED_KEY.format(version=versions[0]), True, timeout=timeout):
+        refresh_featured_pool()
+        # The refresh bumped the FeaturedProduct version
+        return get_featured_pool()
+
+    entries = list(
+        FeaturedProduct.objects
+        .filter(product__status="Publish")
+        .order_by("-weight", "id")
+        .values_list("product_id", "is_pinned", "weight")
+    )
+    # Rows saved with weight 0 before it was validated can never be drawn
+    unpinned = [(product_id, weight) for product_id, is_pinned, weight in entries if not is_pinned and weight > 0]
+    pool = {
+        "pinned": [product_id for product_id, is_pinned, _ in entries if is_pinned],
+        "ids": [product_id for product_id, _ in unpinned],
+        "cumulative_weights": list(accumulate(weight for _, weight in unpinned)),
+    }
+    cache.set(key, pool, timeout=timeout)
+    return pool
+
+
+def pick_featured_ids(count=FEATURED_COUNT):
+    """
+    Pinned books first, then weighted random picks without repeats. Each
+    draw is a binary search of the cumulative weights, so a pick costs
+    O(count * log pool) whatever the pool size.
+    """
+    pool = get_featured_pool()
+    picked = pool["pinned"][:count]
+    ids, cumulative = pool["ids"], pool["cumulative_weights"]
+    if not ids:
+        return picked
+
+    chosen = set(picked)
+    for _ in range(count * DRAWS_PER_PICK):
+        if len(picked) >= count:
+            return picked
+        product_id = ids[bisect_right(cumulative, random.random() * cumulative[-1])]
+        if product_id not in chosen:
+            chosen.add(product_id)
+            picked.append(product_id)
+
+    # Only a few heavy entries kept being redrawn: fill the rest in pool order
+    for product_id in ids:
+        if len(picked) >= count:
+            break
+        if product_id not in chosen:
+            chosen.add(product_id)
+            picked.append(product_id)
+    return picked
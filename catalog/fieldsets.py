@@ -0,0 +1,55 @@
+# fieldsets.py for catalog app
+from rest_framework.serializers import ListSerializer
+from .filters import get_list_param
+
+FIELDS_PARAM = "fields"
+EXCLUDE_PARAM = "exclude"
+
+
+def get_fieldset(params):
+    """
+    Read the sparse fieldset from `?fields=` / `?exclude=`. `fields` is
+    None when every field is wanted.
+    """
+    return {
+        "fields": set(get_list_param(params, FIELDS_PARAM)) or None,
+        "exclude": set(get_list_param(params, EXCLUDE_PARAM)),
+    }
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Drop the fields left out by the fieldset in the serializer context.
+    Only the top-level serializer (or the child of a top-level list) is
+    trimmed, nested serializers keep their full shape.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_fieldset_root():
+            return fields
+
+        requested = self.context.get("fields")
+        excluded = self.context.get("exclude") or ()
+        for name in list(fields):
+            if (requested is not None and name not in requested) or name in excluded:
+                fields.pop(name)
+        return fields
+
+    def is_fieldset_root(self):
+        if self.parent is None:
+            return True
+        return isinstance(self.parent, ListSerializer) and self.parent.parent is None
+
+
+class SparseFieldsetViewMixin:
+    """ Pass the request's sparse fieldset to the serializer context. """
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context.update(get_fieldset(self.request.query_params))
+        return context
+
+    def get_serialized_fields(self):
+        """ Names of the fields the response will contain, used to trim the queryset. """
+        return set(self.get_serializer().fields)
@@ -0,0 +1,191 @@
+# filters.py for catalog app
+from decimal import Decimal
+from django.db.models import Q, Count, OuterRef, Subquery, IntegerField
+from .constants import BOOK_FORMAT_CHOICES, BOOK_LANGUAGES
+from .models import Category, Product
+from .search import search_products
+from .utils import filter_by_category_subtrees, CountDistinct
+
+FORMAT_TYPE_OPTIONS = {
+    "ebook": Q(format_type="ebook") | Q(format_type="both"),
+    "physical": Q(format_type="physical") | Q(format_type="both"),
+}
+
+# Stock status filter values (maps ebook + physical)
+STOCK_STATUS_OPTIONS = {
+    "in_stock": Q(physical_stock_status="in_stock") | Q(ebook_stock_status="available"),
+    "out_of_stock": Q(physical_stock_status="out_of_stock") & Q(ebook_stock_status="unavailable"),
+    "pre_order": Q(physical_stock_status="pre_order") | Q(ebook_stock_status="pre_order"),
+    "backorder": Q(physical_stock_status="backorder"),
+    "out_of_print": Q(physical_stock_status="out_of_print"),
+    "print_on_demand": Q(physical_stock_status="print_on_demand"),
+    "available": Q(ebook_stock_status="available"),
+    "unavailable": Q(ebook_stock_status="unavailable"),
+}
+
+# (label, min inclusive, max exclusive) for the price facet
+PRICE_BUCKETS = [
+    ("0-10", None, Decimal("10")),
+    ("10-20", Decimal("10"), Decimal("20")),
+    ("20-50", Decimal("20"), Decimal("50")),
+    ("50-100", Decimal("50"), Decimal("100")),
+    ("100+", Decimal("100"), None),
+]
+
+RATING_THRESHOLDS = range(1, 6)
+
+
+def get_list_param(params, name):
+    """ Values of a repeated or comma separated query parameter. """
+    return [
+        value.strip()
+        for param in params.getlist(name)
+        for value in param.split(",")
+        if value.strip()
+    ]
+
+
+def format_type_q(value):
+    return FORMAT_TYPE_OPTIONS.get(value, Q(format_type=value))
+
+
+def stock_status_q(value):
+    if value in STOCK_STATUS_OPTIONS:
+        return STOCK_STATUS_OPTIONS[value]
+    # Fallback: match directly in either field
+    return Q(physical_stock_status__iexact=value) | Q(ebook_stock_status__iexact=value)
+
+
+def rating_q(threshold):
+    # Frontend sends 1–5, return < that OR no reviews
+    return Q(avg_rating__lt=threshold) | Q(rating_count=0)
+
+
+def price_bucket_q(low, high):
+    condition = Q()
+    if low is not None:
+        condition &= Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+def apply_book_filters(queryset, params, exclude=()):
+    """
+    Apply the BookListView filters found in `params`. Filters named in
+    `exclude` are skipped, which the facets endpoint uses to count each
+    facet against every other active filter.
+    """
+    category_slugs = get_list_param(params, "category")
+    if category_slugs and "category" not in exclude:
+        queryset = filter_by_category_subtrees(queryset, category_slugs)
+
+    format_type = params.get("format_type")
+    if format_type and "format_type" not in exclude:
+        queryset = queryset.filter(format_type_q(format_type))
+
+    stock_status = params.get("stock_status")
+    if stock_status and "stock_status" not in exclude:
+        queryset = queryset.filter(stock_status_q(stock_status))
+
+    language = params.get("language")
+    if language and "language" not in exclude:
+        queryset = queryset.filter(language=language)
+
+    if "price" not in exclude:
+        price_min = params.get("price_min")
+        price_max = params.get("price_max")
+        if price_min:
+            queryset = queryset.filter(price__gte=price_min)
+        if price_max:
+            queryset = queryset.filter(price__lte=price_max)
+
+    rating_threshold = params.get("rating")
+    if rating_threshold and "rating" not in exclude:
+        try:
+            queryset = queryset.filter(rating_q(int(rating_threshold)))
+        except ValueError:
+            pass
+
+    search_query = params.get("search")
+    if search_query:
+        queryset = search_products(queryset, search_query)
+
+    return queryset
+
+
+def get_active_filters(params):
+    active = set()
+    for name in ("category", "format_type", "stock_status", "language", "rating"):
+        if params.get(name):
+            active.add(name)
+    if params.get("price_min") or params.get("price_max"):
+        active.add("price")
+    return active
+
+
+def get_facet_options():
+    """ Conditions counted for every facet except category, keyed by facet then option. """
+    return {
+        "format_type": {value: format_type_q(value) for value, _ in BOOK_FORMAT_CHOICES},
+        "stock_status": dict(STOCK_STATUS_OPTIONS),
+        "language": {code: Q(language=code) for code, _ in BOOK_LANGUAGES},
+        "price": {label: price_bucket_q(low, high) for label, low, high in PRICE_BUCKETS},
+        "rating": {str(threshold): rating_q(threshold) for threshold in RATING_THRESHOLDS},
+    }
+
+
+def compute_book_facets(params):
+    """
+    Count every facet for the current filter set, each one with its own
+    filter excluded (disjunctive faceting). Facets whose filter is not
+    active share one conditional-count aggregate; each active facet gets
+    its own aggregate, and categories one correlated-count query.
+    """
+    active = get_active_filters(params)
+    options = get_facet_options()
+    facets = {}
+
+    # Group facets by the filter they exclude (None when it is not active)
+    groups = {}
+    for facet in options:
+        groups.setdefault(facet if facet in active else None, []).append(facet)
+
+    for excluded, facet_names in groups.items():
+        queryset = apply_book_filters(
+            Product.objects.all(), params, exclude=(excluded,) if excluded else ()
+        )
+        keys = [(facet, option) for facet in facet_names for option in options[facet]]
+        totals = queryset.order_by().aggregate(**{
+            f"count_{index}": Count("id", filter=options[facet][option])
+            for index, (facet, option) in enumerate(keys)
+        })
+        for index, (facet, option) in enumerate(keys):
+            facets.setdefault(facet, {})[option] = totals[f"count_{index}"]
+
+    facets["category"] = compute_category_facet(params)
+    return facets
+
+
+def compute_category_facet(params):
+    # Counts include subcategories, matching the subtree category filter
+    products = apply_book_filters(Product.objects.all(), params, exclude=("category",))
+    subtree_count = (
+        Product.categories.through.objects
+        .filter(
+            product_id__in=products.order_by().values("id"),
+            category__tree_id=OuterRef("tree_id"),
+            category__lft__gte=OuterRef("lft"),
+            category__rght__lte=OuterRef("rght"),
+        )
+        .annotate(total=CountDistinct("product_id"))
+        .values("total")
+    )
+    categories = (
+        Category.objects
+        .annotate(product_count=Subquery(subtree_count, output_field=IntegerField()))
+        .filter(product_count__gt=0)
+        .order_by("-product_count", "name")
+        .values("slug", "name", "product_count")
+    )
+    return list(categories)
@@ -0,0 +1,157 @@
+# images.py for catalog app
+import hashlib
+import logging
+import os
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from .cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = "derivatives"
+# Bounding boxes (width, height) sized for 2:3 covers; images are never upscaled
+IMAGE_SIZES = {
+    "thumbnail": (150, 225),
+    "card": (300, 450),
+    "detail": (600, 900),
+}
+# Derivative format -> (Pillow format, save options)
+IMAGE_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+MANIFEST_KEY = "catalog_image_derivatives:{digest}"
+
+
+def derivative_name(name, size, image_format):
+    """ Storage path of one derivative, derived from the source path alone. """
+    root, _ = os.path.splitext(name)
+    return f"{DERIVATIVES_DIR}/{root}/{size}.{image_format}"
+
+
+def _manifest_key(name):
+    return MANIFEST_KEY.format(digest=hashlib.md5(name.encode()).hexdigest())
+
+
+def record_derivatives(name, storage=None):
+    """
+    Store which derivatives of `name` exist, as "size.format" entries, so
+    srcsets never list a file that was not generated. Returns the entries.
+    """
+    storage = storage or default_storage
+    manifest = [
+        f"{size}.{image_format}"
+        for size in IMAGE_SIZES
+        for image_format in IMAGE_FORMATS
+        if storage.exists(derivative_name(name, size, image_format))
+    ]
+    get_cache().set(_manifest_key(name), manifest, timeout=getattr(settings, "IMAGE_MANIFEST_TIMEOUT", 60 * 60))
+    return manifest
+
+
+def get_derivatives(name, storage=None):
+    """ The recorded "size.format" entries of `name`, checked in storage on a cache miss. """
+    manifest = get_cache().get(_manifest_key(name))
+    if manifest is None:
+        manifest = record_derivatives(name, storage)
+    return manifest
+
+
+def _modified_time(storage, name):
+    try:
+        return storage.get_modified_time(name)
+    except (NotImplementedError, OSError):
+        return None
+
+
+def _is_stale(storage, name, source_time):
+    if not storage.exists(name):
+        return True
+    derivative_time = _modified_time(storage, name)
+    return source_time is not None and derivative_time is not None and derivative_time < source_time
+
+
+def _render(image, size, image_format):
+    pillow_format, options = IMAGE_FORMATS[image_format]
+    resized = image.copy()
+    resized.thumbnail(IMAGE_SIZES[size], Image.LANCZOS)
+    if pillow_format == "JPEG" and resized.mode != "RGB":
+        # JPEG has no alpha channel, flatten onto white
+        background = Image.new("RGB", resized.size, (255, 255, 255))
+        rgba = resized.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        resized = background
+    buffer = BytesIO()
+    resized.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def generate_derivatives(name, force=False, storage=None):
+    """
+    Write every size and format of the image stored at `name`. Derivatives
+    newer than their source are kept, so repeated runs only redo images
+    whose source changed. Returns the number of files written.
+    """
+    storage = storage or default_storage
+    if not name or not storage.exists(name):
+        return 0
+
+    source_time = _modified_time(storage, name)
+    pending = [
+        (size, image_format)
+        for size in IMAGE_SIZES
+        for image_format in IMAGE_FORMATS
+        if force or _is_stale(storage, derivative_name(name, size, image_format), source_time)
+    ]
+    if not pending:
+        return 0
+
+    written = 0
+    try:
+        with storage.open(name, "rb") as source:
+            image = Image.open(source)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+        for size, image_format in pending:
+            target = derivative_name(name, size, image_format)
+            content = _render(image, size, image_format)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(content))
+            written += 1
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        # Unreadable or oversized uploads keep being served as originals
+        logger.warning("Could not generate derivatives for %s: %s", name, exc)
+    finally:
+        record_derivatives(name, storage)
+    return written
+
+
+def image_srcset(image, request=None):
+    """
+    `srcset` strings per format for an image field, e.g.
+    {"webp": ".../thumbnail.webp 150w, .../card.webp 300w, ...", "jpg": ...}.
+    Only derivatives recorded as generated are listed; formats without any
+    are left out, and None means clients should use the original.
+    """
+    if not image:
+        return None
+
+    def url(name):
+        path = image.storage.url(name)
+        return request.build_absolute_uri(path) if request else path
+
+    available = set(get_derivatives(image.name, image.storage))
+    srcset = {}
+    for image_format in IMAGE_FORMATS:
+        entries = [
+            f"{url(derivative_name(image.name, size, image_format))} {width}w"
+            for size, (width, _) in IMAGE_SIZES.items()
+            if f"{size}.{image_format}" in available
+        ]
+        if entries:
+            srcset[image_format] = ", ".join(entries)
+    return srcset or None
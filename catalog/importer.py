@@ -0,0 +1,301 @@
+# importer.py for catalog app
+import csv
+import json
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.text import slugify
+from .cache import invalidate_bulk_writes
+from .models import Author, Category, Publisher, Tag, Product, ProductRatingSummary
+from .search import refresh_search_documents
+
+IMPORT_BATCH_SIZE = 1000
+LIST_SEPARATOR = "|"
+MAX_REPORTED_ERRORS = 50
+# Room left in a 255 character slug for a "-<n>" collision suffix
+SLUG_BASE_LENGTH = 240
+
+REQUIRED_FIELDS = ("isbn", "title", "price", "pages")
+# Scalar Product fields a feed row may set, converted with each model field's clean()
+PRODUCT_FIELDS = (
+    "title", "description", "publication_date", "price", "stock_quantity", "format_type",
+    "language", "ebook_file_size", "pages", "file_url", "status",
+)
+UPDATE_FIELDS = PRODUCT_FIELDS + ("publisher", "physical_stock_status", "ebook_stock_status", "updated_at")
+# M2M field on Product -> model upserted by name
+RELATION_FIELDS = {
+    "authors": Author,
+    "categories": Category,
+    "tags": Tag,
+}
+
+
+def read_feed(stream, feed_format):
+    """ Yield (line number, row) pairs from a CSV or JSONL stream, one row at a time. """
+    if feed_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def name_key(name):
+    return name.casefold()
+
+
+def allocate_slugs(model, bases, chunk_size=100):
+    """
+    Return a free slug for each base, adding -2, -3... on collisions with
+    stored rows or earlier bases. Taken slugs are read with one query for
+    the exact bases plus one prefix query per chunk of colliding bases.
+    """
+    taken = set(model.objects.filter(slug__in=set(bases)).values_list("slug", flat=True))
+    seen = set()
+    colliding = set()
+    for base in bases:
+        if base in taken or base in seen:
+            colliding.add(base)
+        seen.add(base)
+
+    colliding = list(colliding)
+    for start in range(0, len(colliding), chunk_size):
+        prefixes = Q()
+        for base in colliding[start:start + chunk_size]:
+            prefixes |= Q(slug__startswith=f"{base}-")
+        taken.update(model.objects.filter(prefixes).values_list("slug", flat=True))
+
+    slugs = []
+    for base in bases:
+        slug, suffix = base, 2
+        while slug in taken:
+            slug = f"{base}-{suffix}"
+            suffix += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def slug_base(text, fallback):
+    return slugify(text)[:SLUG_BASE_LENGTH].strip("-") or fallback
+
+
+class CatalogImporter:
+    """
+    Upsert a stream of feed rows into the catalog in batches. Products are
+    matched by ISBN (the last row wins when a batch repeats one), authors,
+    publishers, categories and tags by name, and every write is a bulk
+    statement, so a batch costs a fixed number of queries whatever its
+    size. Only the name lookups outlive a batch.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, separator=LIST_SEPARATOR, progress=None):
+        self.batch_size = batch_size
+        self.separator = separator
+        self.progress = progress
+        self.lookups = {Author: {}, Publisher: {}, Category: {}, Tag: {}}
+        self.categories_created = False
+        self.stats = {"rows": 0, "created": 0, "updated": 0, "duplicates": 0, "skipped": 0}
+        self.errors = []
+
+    def run(self, rows):
+        batch = {}
+        for number, row in rows:
+            self.stats["rows"] += 1
+            record = self.clean_row(number, row)
+            if record is None:
+                continue
+            if record["isbn"] in batch:
+                self.stats["duplicates"] += 1
+            batch[record["isbn"]] = record
+            if len(batch) >= self.batch_size:
+                self.import_batch(list(batch.values()))
+                batch = {}
+
+        if batch:
+            self.import_batch(list(batch.values()))
+        self.finish()
+        return self.stats
+
+    def skip(self, number, message):
+        self.stats["skipped"] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {number}: {message}")
+
+    def split_names(self, value):
+        if isinstance(value, str):
+            value = value.split(self.separator)
+        names = []
+        for name in value or []:
+            name = str(name).strip()
+            if name and name_key(name) not in {name_key(existing) for existing in names}:
+                names.append(name)
+        return names
+
+    def clean_row(self, number, row):
+        if not isinstance(row, dict):
+            self.skip(number, "unreadable row")
+            return None
+
+        missing = [name for name in REQUIRED_FIELDS if str(row.get(name) or "").strip() == ""]
+        if missing:
+            self.skip(number, f"missing {', '.join(missing)}")
+            return None
+
+        record = {}
+        try:
+            isbn = str(row["isbn"]).replace("-", "").replace(" ", "")
+            record["isbn"] = Product._meta.get_field("isbn").clean(isbn, None)
+            for name in PRODUCT_FIELDS:
+                value = row.get(name)
+                if isinstance(value, str):
+                    value = value.strip()
+                if value is None or value == "":
+                    continue
+                record[name] = Product._meta.get_field(name).clean(value, None)
+        except ValidationError as exc:
+            self.skip(number, "; ".join(exc.messages))
+            return None
+
+        if "publisher" in row:
+            names = self.split_names(row["publisher"] or "")
+            record["publisher"] = names[0] if names else None
+        for field, model in RELATION_FIELDS.items():
+            if field in row:
+                record[field] = self.split_names(row[field])
+
+        for field, model in [("publisher", Publisher), *RELATION_FIELDS.items()]:
+            names = record.get(field) or []
+            names = [names] if isinstance(names, str) else names
+            max_length = model._meta.get_field("name").max_length
+            if any(len(name) > max_length for name in names):
+                self.skip(number, f"{field} names are limited to {max_length} characters")
+                return None
+        return record
+
+    def import_batch(self, records):
+        with transaction.atomic():
+            self.resolve_names(Publisher, [record["publisher"] for record in records if record.get("publisher")])
+            for field, model in RELATION_FIELDS.items():
+                self.resolve_names(model, [name for record in records for name in record.get(field, [])])
+
+            product_ids = self.upsert_products(records)
+            self.replace_links(records, product_ids)
+
+        refresh_search_documents(product_ids.values())
+        if self.progress:
+            self.progress(self.stats)
+
+    def resolve_names(self, model, names):
+        """ Map names to ids in `self.lookups`, creating the missing rows in bulk. """
+        lookup = self.lookups[model]
+        missing = {}
+        for name in names:
+            if name_key(name) not in lookup:
+                missing.setdefault(name_key(name), name)
+        if not missing:
+            return
+
+        self.load_names(model, missing.values())
+        new_names = [name for key, name in missing.items() if key not in lookup]
+        if new_names:
+            model.objects.bulk_create(self.build_rows(model, new_names), ignore_conflicts=True)
+            # bulk_create does not return ids on every backend, read them back
+            self.load_names(model, new_names)
+
+    def load_names(self, model, names):
+        lookup = self.lookups[model]
+        # Author names are not unique, the oldest author with a name is used
+        for name, pk in model.objects.filter(name__in=list(names)).order_by("-id").values_list("name", "id"):
+            lookup[name_key(name)] = pk
+
+    def build_rows(self, model, names):
+        if model is Author or model is Publisher:
+            return [model(name=name) for name in names]
+
+        slugs = allocate_slugs(model, [slug_base(name, model._meta.model_name) for name in names])
+        if model is Tag:
+            return [Tag(name=name, slug=slug) for name, slug in zip(names, slugs)]
+
+        # New categories are inserted as single-node trees, ordered by finish()
+        next_tree_id = (Category.objects.aggregate(last=Max("tree_id"))["last"] or 0) + 1
+        self.categories_created = True
+        return [
+            Category(name=name, slug=slug, tree_id=next_tree_id + index, lft=1, rght=2, level=0)
+            for index, (name, slug) in enumerate(zip(names, slugs))
+        ]
+
+    def upsert_products(self, records):
+        now = timezone.now()
+        existing = Product.objects.filter(isbn__in=[record["isbn"] for record in records]).in_bulk(field_name="isbn")
+        created, updated = [], []
+
+        for record in records:
+            product = existing.get(record["isbn"])
+            if product is None:
+                product = Product(isbn=record["isbn"], publication_date=now.date())
+                created.append(product)
+            else:
+                updated.append(product)
+
+            for name in PRODUCT_FIELDS:
+                if name in record:
+                    setattr(product, name, record[name])
+            if "publisher" in record:
+                publisher = record["publisher"]
+                product.publisher_id = self.lookups[Publisher][name_key(publisher)] if publisher else None
+            product.update_stock_status()
+            product.updated_at = now
+
+        slugs = allocate_slugs(Product, [slug_base(product.title, "book") for product in created])
+        for product, slug in zip(created, slugs):
+            product.slug = slug
+
+        Product.objects.bulk_create(created)
+        if updated:
+            Product.objects.bulk_update(updated, UPDATE_FIELDS)
+
+        product_ids = dict(
+            Product.objects.filter(isbn__in=[record["isbn"] for record in records]).values_list("isbn", "id")
+        )
+        ProductRatingSummary.objects.bulk_create(
+            [ProductRatingSummary(product_id=product_ids[product.isbn]) for product in created],
+            ignore_conflicts=True,
+        )
+        self.stats["created"] += len(created)
+        self.stats["updated"] += len(updated)
+        return product_ids
+
+    def replace_links(self, records, product_ids):
+        """ Replace the M2M rows of every field a record provides with one delete and one insert. """
+        for field, model in RELATION_FIELDS.items():
+            through = getattr(Product, field).through
+            column = f"{model._meta.model_name}_id"
+            touched = [record for record in records if field in record]
+            if not touched:
+                continue
+
+            through.objects.filter(product_id__in=[product_ids[record["isbn"]] for record in touched]).delete()
+            through.objects.bulk_create(
+                [
+                    through(product_id=product_ids[record["isbn"]], **{column: self.lookups[model][name_key(name)]})
+                    for record in touched
+                    for name in record[field]
+                ],
+                ignore_conflicts=True,
+            )
+
+    def finish(self):
+        if self.categories_created:
+            # Place the new root categories by name, as order_insertion_by would have
+            Category.objects.rebuild()
+        invalidate_bulk_writes(Author, Category, Publisher, Tag, Product, Product.categories.through)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from catalog.cache import get_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the catalog response cache."
+
+    def handle(self, *args, **options):
+        stats = get_cache_stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} hit_ratio={stats['hit_ratio']}"
+        )
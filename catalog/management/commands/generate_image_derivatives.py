@@ -0,0 +1,81 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from catalog.images import generate_derivatives
+from catalog.models import Author, Category, ProductImage
+
+# (model, image field) pairs whose stored files get derivatives
+IMAGE_SOURCES = [
+    (ProductImage, "image"),
+    (Category, "icon"),
+    (Author, "photo"),
+]
+
+
+def _generate(args):
+    name, force = args
+    return generate_derivatives(name, force=force)
+
+
+class Command(BaseCommand):
+    help = "Generate the resized and WebP derivatives of existing book covers, category icons and author photos."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes resizing images (default: one per CPU, 1 runs inline).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of images handed to the pool per batch (default: 500).",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate derivatives even when they are newer than their source.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        pool = None
+        if workers > 1:
+            # Workers only touch storage, do not share this process' DB connections
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+
+        images = written = 0
+        try:
+            for names in self.iter_source_names(options["chunk_size"]):
+                tasks = [(name, options["force"]) for name in names]
+                results = pool.map(_generate, tasks, chunksize=16) if pool else map(_generate, tasks)
+                written += sum(results)
+                images += len(names)
+                self.stdout.write(f"Checked {images} images, wrote {written} derivatives...")
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {images} images, wrote {written} derivatives."))
+
+    def iter_source_names(self, chunk_size):
+        for model, field in IMAGE_SOURCES:
+            last_id = 0
+            while True:
+                rows = list(
+                    model.objects
+                    .filter(id__gt=last_id)
+                    .exclude(**{field: ""})
+                    .exclude(**{f"{field}__isnull": True})
+                    .order_by("id")
+                    .values_list("id", field)[:chunk_size]
+                )
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                yield [name for _, name in rows]
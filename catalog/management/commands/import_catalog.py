@@ -0,0 +1,62 @@
+import os
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from catalog.importer import CatalogImporter, read_feed, IMPORT_BATCH_SIZE, LIST_SEPARATOR
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or JSONL feed into the catalog, upserting books by ISBN in bulk batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Feed file, or - to read from stdin.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Feed format (default: taken from the file extension).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help=f"Number of books to upsert per batch (default: {IMPORT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--separator",
+            default=LIST_SEPARATOR,
+            help=f"Separator of multi-valued CSV columns such as authors (default: {LIST_SEPARATOR}).",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        feed_format = options["format"]
+        if feed_format is None:
+            extension = os.path.splitext(path)[1].lower()
+            feed_format = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}.get(extension)
+        if feed_format is None:
+            raise CommandError("Cannot tell the feed format, pass --format csv or --format jsonl.")
+
+        importer = CatalogImporter(
+            batch_size=options["batch_size"],
+            separator=options["separator"],
+            progress=self.report_progress,
+        )
+        if path == "-":
+            stats = importer.run(read_feed(sys.stdin, feed_format))
+        else:
+            try:
+                with open(path, newline="", encoding="utf-8") as stream:
+                    stats = importer.run(read_feed(stream, feed_format))
+            except FileNotFoundError:
+                raise CommandError(f"Feed not found: {path}")
+
+        for error in importer.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['rows']} rows: {stats['created']} created, {stats['updated']} updated, "
+            f"{stats['duplicates']} duplicate ISBNs, {stats['skipped']} skipped."
+        ))
+
+    def report_progress(self, stats):
+        self.stdout.write(
+            f"Processed {stats['rows']} rows ({stats['created']} created, {stats['updated']} updated)..."
+        )
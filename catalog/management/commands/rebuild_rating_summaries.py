@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from catalog.models import Product, ProductRating, ProductRatingSummary
+from catalog.cache import invalidate_bulk_writes
+
+
+class Command(BaseCommand):
+    help = "Rebuild ProductRatingSummary rows from the ProductRating table in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of products to rebuild per batch (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_id = 0
+        rebuilt = 0
+
+        while True:
+            product_ids = list(
+                Product.objects
+                .filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:chunk_size]
+            )
+            if not product_ids:
+                break
+
+            ProductRatingSummary.rebuild_for_products(product_ids)
+            rebuilt += len(product_ids)
+            last_id = product_ids[-1]
+            self.stdout.write(f"Rebuilt {rebuilt} summaries...")
+
+        invalidate_bulk_writes(ProductRating)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries for {rebuilt} products."))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from catalog.models import Product, ProductRelatedIndex
+from catalog.cache import invalidate_bulk_writes
+from catalog.related import rebuild_related_index, RELATED_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Rebuild the related-books index for the whole catalog in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=RELATED_CHUNK_SIZE,
+            help=f"Number of products to score per batch (default: {RELATED_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_id = 0
+        rebuilt = 0
+
+        while True:
+            product_ids = list(
+                Product.objects
+                .filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:chunk_size]
+            )
+            if not product_ids:
+                break
+
+            rebuild_related_index(product_ids, chunk_size=chunk_size)
+            rebuilt += len(product_ids)
+            last_id = product_ids[-1]
+            self.stdout.write(f"Scored {rebuilt} products...")
+
+        invalidate_bulk_writes(ProductRelatedIndex)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt related books for {rebuilt} products."))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from catalog.models import Product
+from catalog.cache import invalidate_bulk_writes
+from catalog.search import refresh_search_documents, SEARCH_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Rebuild ProductSearchDocument rows for the whole catalog in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=SEARCH_CHUNK_SIZE,
+            help=f"Number of products to index per batch (default: {SEARCH_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_id = 0
+        indexed = 0
+
+        while True:
+            product_ids = list(
+                Product.objects
+                .filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:chunk_size]
+            )
+            if not product_ids:
+                break
+
+            refresh_search_documents(product_ids, chunk_size=chunk_size)
+            indexed += len(product_ids)
+            last_id = product_ids[-1]
+            self.stdout.write(f"Indexed {indexed} products...")
+
+        invalidate_bulk_writes(Product)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search documents for {indexed} products."))
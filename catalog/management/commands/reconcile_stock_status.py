@@ -0,0 +1,37 @@
+import time
+from django.core.management.base import BaseCommand
+from catalog.stock import reconcile_stock_status
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the physical and eBook stock statuses of the whole catalog with set-based updates. "
+        "Run it daily (e.g. from cron after midnight) or keep it running with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep reconciling every --interval seconds instead of running once.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=60 * 60,
+            help="Seconds between runs in --loop mode (default: 3600).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.reconcile()
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+    def reconcile(self):
+        changed = reconcile_stock_status()
+        for transition, count in changed.items():
+            if count:
+                self.stdout.write(f"{transition}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Reconciled stock status, {sum(changed.values())} status updates."))
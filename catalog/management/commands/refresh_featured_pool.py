@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from catalog.featured import refresh_featured_pool
+
+
+class Command(BaseCommand):
+    help = "Resample the automatic entries of the featured books pool. Run it periodically (e.g. hourly cron)."
+
+    def handle(self, *args, **options):
+        pooled = refresh_featured_pool()
+        self.stdout.write(self.style.SUCCESS(f"Featured pool refreshed with {pooled} automatic entries."))
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.12 on 2026-10-17 20:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+BACKFILL_CHUNK_SIZE = 500
+
+
+def backfill_rating_summaries(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    ProductRating = apps.get_model('catalog', 'ProductRating')
+    ProductRatingSummary = apps.get_model('catalog', 'ProductRatingSummary')
+    last_id = 0
+    while True:
+        product_ids = list(
+            Product.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BACKFILL_CHUNK_SIZE]
+        )
+        if not product_ids:
+            break
+        last_id = product_ids[-1]
+
+        summaries = {product_id: ProductRatingSummary(product_id=product_id) for product_id in product_ids}
+        rows = (
+            ProductRating.objects
+            .filter(product_id__in=product_ids)
+            .values('product_id', 'score')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        for row in rows:
+            summary = summaries[row['product_id']]
+            setattr(summary, f"score_{row['score']}", row['total'])
+            summary.rating_count += row['total']
+            summary.rating_sum += row['score'] * row['total']
+        for summary in summaries.values():
+            summary.average_rating = summary.rating_sum / summary.rating_count if summary.rating_count else 0
+        ProductRatingSummary.objects.bulk_create(summaries.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_discount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRatingSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('score_1', models.PositiveIntegerField(default=0)),
+                ('score_2', models.PositiveIntegerField(default=0)),
+                ('score_3', models.PositiveIntegerField(default=0)),
+                ('score_4', models.PositiveIntegerField(default=0)),
+                ('score_5', models.PositiveIntegerField(default=0)),
+                ('average_rating', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rating_summary', to='catalog.product')),
+            ],
+        ),
+        migrations.RunPython(backfill_rating_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.12 on 2026-10-17 20:37
+
+from django.db import migrations, models
+
+
+def copy_main_images(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    ProductImage = apps.get_model('catalog', 'ProductImage')
+    for image in ProductImage.objects.filter(is_main=True).only('book_id', 'image').iterator():
+        Product.objects.filter(pk=image.book_id).update(main_image=image.image.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_productratingsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='main_image',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='books/images/'),
+        ),
+        migrations.RunPython(copy_main_images, migrations.RunPython.noop),
+    ]
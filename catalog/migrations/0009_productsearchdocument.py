@@ -0,0 +1,74 @@
+# Generated by Django 5.0.12 on 2026-10-17 20:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_CHUNK_SIZE = 500
+
+
+def backfill_search_documents(apps, schema_editor):
+    # Same text as catalog.search.build_search_document, built from the historical models
+    Product = apps.get_model('catalog', 'Product')
+    ProductSearchDocument = apps.get_model('catalog', 'ProductSearchDocument')
+    last_id = 0
+    while True:
+        products = list(
+            Product.objects
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'title', 'isbn')
+            .prefetch_related('authors', 'categories', 'tags')[:BACKFILL_CHUNK_SIZE]
+        )
+        if not products:
+            break
+        last_id = products[-1].id
+
+        documents = []
+        for product in products:
+            parts = [product.title]
+            parts.extend(author.name for author in product.authors.all())
+            parts.extend(category.name for category in product.categories.all())
+            parts.extend(tag.name for tag in product.tags.all())
+            parts.append(product.isbn)
+            documents.append(ProductSearchDocument(
+                product_id=product.id,
+                document=' '.join(part for part in parts if part).lower(),
+            ))
+        ProductSearchDocument.objects.bulk_create(documents)
+
+
+def add_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE catalog_productsearchdocument '
+            'ADD FULLTEXT INDEX catalog_search_document_ft (document)'
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE catalog_productsearchdocument '
+            'DROP INDEX catalog_search_document_ft'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_product_main_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='catalog.product')),
+            ],
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.12 on 2026-10-17 20:44
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def copy_rating_totals(apps, schema_editor):
+    # Aggregated from the ratings themselves, so the columns are right even
+    # where the summaries were never backfilled
+    Product = apps.get_model('catalog', 'Product')
+    ProductRating = apps.get_model('catalog', 'ProductRating')
+    ratings = ProductRating.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id')
+    Product.objects.update(
+        avg_rating=Coalesce(
+            Subquery(ratings.annotate(average=Avg('score', output_field=FloatField())).values('average')[:1]),
+            Value(0.0),
+        ),
+        rating_count=Coalesce(
+            Subquery(ratings.annotate(total=Count('id')).values('total')[:1], output_field=IntegerField()),
+            Value(0),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='avg_rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['avg_rating', 'id'], name='product_avg_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating_count', 'id'], name='product_rating_count_id_idx'),
+        ),
+        migrations.RunPython(copy_rating_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.12 on 2026-10-17 20:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_product_avg_rating_rating_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeaturedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_pinned', models.BooleanField(default=False, help_text='Always show this book first')),
+                ('weight', models.PositiveSmallIntegerField(default=1, help_text='Relative chance of being picked')),
+                ('is_automatic', models.BooleanField(default=False, editable=False)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='featured_entry', to='catalog.product')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
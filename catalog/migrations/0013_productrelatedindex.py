@@ -0,0 +1,23 @@
+# Generated by Django 5.0.12 on 2026-10-17 20:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_featuredproduct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRelatedIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('related_ids', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='related_index', to='catalog.product')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.12 on 2026-10-17 20:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_productrelatedindex'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productrating',
+            index=models.Index(fields=['product', 'created_at', 'id'], name='rating_product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productrating',
+            index=models.Index(fields=['product', 'score', 'id'], name='rating_product_score_idx'),
+        ),
+    ]
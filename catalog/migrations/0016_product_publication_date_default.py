@@ -0,0 +1,19 @@
+# Generated by Django 5.0.12 on 2026-10-17 20:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0015_product_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='publication_date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+    ]
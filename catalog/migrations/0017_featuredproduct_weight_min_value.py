@@ -0,0 +1,19 @@
+# Generated by Django 5.0.12 on 2026-10-17 21:18
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0016_product_publication_date_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='featuredproduct',
+            name='weight',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Relative chance of being picked', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
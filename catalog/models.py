@@ -4,9 +4,12 @@ from django.utils import timezone
 from django.contrib.auth.models import User
 from .constants import PRODUCT_STATUS, BOOK_FORMAT_CHOICES, PHYSICAL_STOCK_STATUS, EBOOK_STOCK_STATUS, BOOK_LANGUAGES
 from mptt.models import MPTTModel, TreeForeignKey
-from django.db.models import Avg
+from django.db.models import Avg, Count, F, Case, When, Value, FloatField, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce
+from django.db import transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from .validators import validate_non_negative
+from .upsert import bulk_upsert
 from django.core.exceptions import ValidationError
 
 class TimeStampedModel(models.Model):
@@ -74,7 +77,7 @@ class Product(TimeStampedModel):
     slug = models.SlugField(max_length=255, unique=True, blank=True)
     isbn = models.CharField(max_length=13, unique=True)
     description = models.TextField(blank=True, null=True)
-    publication_date = models.DateField(default=timezone.now)
+    publication_date = models.DateField(default=timezone.localdate)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock_quantity = models.PositiveIntegerField(default=0)
     format_type = models.CharField(
@@ -121,37 +124,73 @@ class Product(TimeStampedModel):
     publisher = models.ForeignKey(Publisher, related_name="books", on_delete=models.SET_NULL, null=True, blank=True)
     tags = models.ManyToManyField(Tag, related_name="books", blank=True)
     status = models.CharField(max_length=50, choices=PRODUCT_STATUS, default="Publish")
+    # Copy of the main ProductImage path, kept in sync by ProductImage.save
+    main_image = models.ImageField(upload_to="books/images/", blank=True, null=True, editable=False)
+    # Copies of ProductRatingSummary values, kept in sync on every ProductRating write
+    avg_rating = models.FloatField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Maintained with queryset updates, never written back from a stale instance
+    DENORMALIZED_FIELDS = ("main_image", "avg_rating", "rating_count")
+
+    PHYSICAL_FORMATS = ("physical", "both")
+    EBOOK_FORMATS = ("ebook", "both")
+    LOW_STOCK_THRESHOLD = 5
+
+    class Meta:
+        # Composite indexes backing keyset pagination on the book list
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="product_created_at_id_idx"),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["title", "id"], name="product_title_id_idx"),
+            models.Index(fields=["avg_rating", "id"], name="product_avg_rating_id_idx"),
+            models.Index(fields=["rating_count", "id"], name="product_rating_count_id_idx"),
+            # Keyset order of the partner export and its updated_since filter
+            models.Index(fields=["updated_at", "id"], name="product_updated_at_id_idx"),
+        ]
 
     def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get("force_insert") and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DENORMALIZED_FIELDS
+            ]
+
         if not self.slug:
             self.slug = slugify(self.title)
-        
+
+        self.update_stock_status()
+        super().save(*args, **kwargs)
+
+    def update_stock_status(self):
+        """
+        Derive the stock statuses from the quantity and publication date.
+        catalog.stock.reconcile_stock_status applies the same rules in SQL.
+        """
         # Auto-set physical stock status
-        if self.format_type in ["physical", "both"]:
+        if self.format_type in self.PHYSICAL_FORMATS:
             if self.stock_quantity == 0:
                 self.physical_stock_status = "out_of_stock"
-            elif self.stock_quantity <= 5:
+            elif self.stock_quantity <= self.LOW_STOCK_THRESHOLD:
                 self.physical_stock_status = "low_stock"
             else:
                 self.physical_stock_status = "in_stock"
 
         # Auto-set eBook stock status
-        if self.format_type in ["ebook", "both"]:
-            today = timezone.now().date()
+        if self.format_type in self.EBOOK_FORMATS:
+            today = timezone.localdate()
             if self.publication_date > today:
                 self.ebook_stock_status = "pre_order"
             else:
                 self.ebook_stock_status = "available"
 
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return self.title
     
     @property
     def average_rating(self):
         # Returns the average rating for the book.
-        return self.ratings.aggregate(avg=Avg("score"))["avg"] or 0
+        return self.avg_rating
 
 class ProductRating(TimeStampedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -166,10 +205,130 @@ class ProductRating(TimeStampedModel):
 
     class Meta:
         unique_together = ("user", "product")
+        # Per-book review listing, newest first or by score, with the id tiebreaker
+        indexes = [
+            models.Index(fields=["product", "created_at", "id"], name="rating_product_created_idx"),
+            models.Index(fields=["product", "score", "id"], name="rating_product_score_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} rated {self.product} - {self.score} stars"
     
+class ProductRatingSummary(models.Model):
+    product = models.OneToOneField(Product, related_name="rating_summary", on_delete=models.CASCADE)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    score_1 = models.PositiveIntegerField(default=0)
+    score_2 = models.PositiveIntegerField(default=0)
+    score_3 = models.PositiveIntegerField(default=0)
+    score_4 = models.PositiveIntegerField(default=0)
+    score_5 = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product} - {self.average_rating} ({self.rating_count} ratings)"
+
+    @property
+    def score_counts(self):
+        return {score: getattr(self, f"score_{score}") for score in range(1, 6)}
+
+    @classmethod
+    def apply_rating_change(cls, product_id, score, delta):
+        """ Add (delta=1) or remove (delta=-1) a single score from a product's summary. """
+        with transaction.atomic():
+            updated = cls.objects.filter(product_id=product_id).update(
+                rating_count=F("rating_count") + delta,
+                rating_sum=F("rating_sum") + delta * score,
+                **{f"score_{score}": F(f"score_{score}") + delta},
+            )
+            if not updated:
+                # No summary yet (e.g. rating predates summaries), build it from the ratings table,
+                # which already reflects this save or delete
+                cls.rebuild_for_products([product_id])
+                return
+
+            cls.objects.filter(product_id=product_id).update(
+                average_rating=Case(
+                    When(rating_count=0, then=Value(0.0)),
+                    default=Cast(F("rating_sum"), FloatField()) / F("rating_count"),
+                    output_field=FloatField(),
+                )
+            )
+            cls.copy_to_products([product_id])
+
+    @classmethod
+    def copy_to_products(cls, product_ids):
+        """ Copy average and count onto the indexed Product columns. """
+        summary = cls.objects.filter(product_id=OuterRef("pk"))
+        Product.objects.filter(id__in=product_ids).update(
+            avg_rating=Coalesce(Subquery(summary.values("average_rating")[:1]), Value(0.0)),
+            rating_count=Coalesce(Subquery(summary.values("rating_count")[:1]), Value(0)),
+        )
+
+    @classmethod
+    def rebuild_for_products(cls, product_ids):
+        """ Recompute summaries for the given products from the ratings table. """
+        product_ids = list(product_ids)
+        summaries = {product_id: cls(product_id=product_id) for product_id in product_ids}
+
+        rows = (
+            ProductRating.objects
+            .filter(product_id__in=product_ids)
+            .values("product_id", "score")
+            .annotate(total=Count("id"))
+            .order_by()
+        )
+        for row in rows:
+            summary = summaries[row["product_id"]]
+            setattr(summary, f"score_{row['score']}", row["total"])
+            summary.rating_count += row["total"]
+            summary.rating_sum += row["score"] * row["total"]
+
+        for summary in summaries.values():
+            summary.average_rating = summary.rating_sum / summary.rating_count if summary.rating_count else 0
+
+        bulk_upsert(
+            cls,
+            summaries.values(),
+            ["product"],
+            [
+                "rating_count", "rating_sum", "score_1", "score_2",
+                "score_3", "score_4", "score_5", "average_rating", "updated_at",
+            ],
+        )
+        cls.copy_to_products(product_ids)
+
+class ProductSearchDocument(models.Model):
+    # Flattened title, authors, categories, tags and ISBN of a product.
+    # MySQL gets a FULLTEXT index on `document` (see migration 0009).
+    product = models.OneToOneField(Product, related_name="search_document", on_delete=models.CASCADE)
+    document = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search document for {self.product}"
+
+class FeaturedProduct(TimeStampedModel):
+    # Pool the home page picks featured books from. Rows with is_automatic
+    # are replaced by `refresh_featured_pool`; pinned or manual rows are kept.
+    product = models.OneToOneField(Product, related_name="featured_entry", on_delete=models.CASCADE)
+    is_pinned = models.BooleanField(default=False, help_text="Always show this book first")
+    weight = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)], help_text="Relative chance of being picked")
+    is_automatic = models.BooleanField(default=False, editable=False)
+
+    def __str__(self):
+        return f"Featured: {self.product}"
+
+class ProductRelatedIndex(models.Model):
+    # Top related product ids, best first, built by catalog.related
+    product = models.OneToOneField(Product, related_name="related_index", on_delete=models.CASCADE)
+    related_ids = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Related books for {self.product}"
+
 class ProductImage(TimeStampedModel):
     book = models.ForeignKey(Product, related_name="images", on_delete=models.CASCADE)
     image = models.ImageField(upload_to="books/images/")
@@ -186,6 +345,10 @@ class ProductImage(TimeStampedModel):
 
         super().save(*args, **kwargs)
 
+        # Keep the cached main image path on the product in sync
+        if self.is_main:
+            Product.objects.filter(pk=self.book_id).update(main_image=self.image.name)
+
     def __str__(self):
         return f"Image for {self.book.title}"
     
@@ -1,6 +1,122 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+import json
 
 class BookPagination(PageNumberPagination):
     page_size = 12
     page_size_query_param = "page_size"
     max_page_size = 100
+
+class BookCursorPagination(BasePagination):
+    """
+    Keyset pagination for the book list. The cursor stores the ordering
+    values of the last book on the page, with `id` as the tiebreaker, so
+    every page is an indexed range scan and no COUNT query is run.
+    """
+    page_size = 12
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    ordering_fields = ["title", "price", "created_at", "avg_rating", "rating_count"]
+    default_ordering = ["-created_at"]
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        values = self.decode_cursor(request)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values))
+
+        page_size = self.get_page_size(request)
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        # Keep the view's ordering when it only uses indexed fields, then add the id tiebreaker
+        ordering = [
+            field for field in queryset.query.order_by
+            if isinstance(field, str) and field.lstrip("-") in self.ordering_fields
+        ]
+        if len(ordering) != len(queryset.query.order_by) or not ordering:
+            ordering = list(self.default_ordering)
+        return ordering + ["id"]
+
+    def get_keyset_filter(self, values):
+        # (a, b, id) > (va, vb, vid) written out so each direction is respected
+        keyset = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition = Q(**{f"{name}__{lookup}": values[index]})
+            for previous_index, previous in enumerate(self.ordering[:index]):
+                condition &= Q(**{previous.lstrip("-"): values[previous_index]})
+            keyset |= condition
+        return keyset
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        values = [self.cursor_value(getattr(last, field.lstrip("-"))) for field in self.ordering]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values))
+
+    @staticmethod
+    def cursor_value(value):
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return str(value) if not isinstance(value, (int, str)) else value
+
+    def encode_cursor(self, values):
+        payload = json.dumps({"o": self.ordering, "v": values}, separators=(",", ":"))
+        return urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            padding = "=" * (-len(encoded) % 4)
+            payload = json.loads(urlsafe_b64decode(encoded + padding).decode())
+            if payload["o"] != self.ordering or len(payload["v"]) != len(self.ordering):
+                raise ValueError
+            return [
+                self.model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, payload["v"])
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+class ReviewCursorPagination(BookCursorPagination):
+    """ Keyset pagination for a book's reviews, newest first by default. """
+    page_size = 10
+    max_page_size = 50
+    ordering_fields = ["created_at", "score"]
+    default_ordering = ["-created_at"]
@@ -0,0 +1,111 @@
+# related.py for catalog app
+from collections import defaultdict
+from django.apps import apps
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from .models import Product, ProductRelatedIndex
+from .upsert import bulk_upsert
+
+RELATED_CHUNK_SIZE = 200
+# Only the newest members of each category/tag/author and the latest orders of
+# each book are compared, so large categories do not explode the pair count
+MEMBER_CAP = 200
+ORDER_CAP = 200
+# Order ids bound per basket query, chunk x ORDER_CAP would exceed parameter limits
+ORDER_BATCH_SIZE = 1000
+
+# (M2M field on Product, column on its through table, score per shared value)
+SHARED_RELATIONS = [
+    ("authors", "author_id", 3),
+    ("categories", "category_id", 2),
+    ("tags", "tag_id", 1),
+]
+CO_PURCHASE_WEIGHT = 1
+
+
+def _shared_relation_scores(chunk_ids, field, column, weight, scores):
+    through = getattr(Product, field).through
+    sources = defaultdict(list)
+    for product_id, value in through.objects.filter(product_id__in=chunk_ids).values_list("product_id", column):
+        sources[value].append(product_id)
+    if not sources:
+        return
+
+    members = (
+        through.objects
+        .filter(**{f"{column}__in": list(sources)})
+        .annotate(rank=Window(RowNumber(), partition_by=F(column), order_by=F("product_id").desc()))
+        .filter(rank__lte=MEMBER_CAP)
+        .values_list(column, "product_id")
+    )
+    for value, neighbour_id in members:
+        for product_id in sources[value]:
+            if neighbour_id != product_id:
+                scores[product_id][neighbour_id] += weight
+
+
+def _co_purchase_scores(chunk_ids, scores):
+    OrderItem = apps.get_model("store", "OrderItem")
+    orders = defaultdict(list)
+    recent_items = (
+        OrderItem.objects
+        .filter(product_id__in=chunk_ids)
+        .annotate(rank=Window(RowNumber(), partition_by=F("product_id"), order_by=F("order_id").desc()))
+        .filter(rank__lte=ORDER_CAP)
+        .values_list("order_id", "product_id")
+    )
+    for order_id, product_id in recent_items:
+        orders[order_id].append(product_id)
+    if not orders:
+        return
+
+    order_ids = list(orders)
+    for start in range(0, len(order_ids), ORDER_BATCH_SIZE):
+        basket_items = (
+            OrderItem.objects
+            .filter(order_id__in=order_ids[start:start + ORDER_BATCH_SIZE])
+            .values_list("order_id", "product_id")
+        )
+        for order_id, neighbour_id in basket_items:
+            for product_id in orders[order_id]:
+                if neighbour_id != product_id:
+                    scores[product_id][neighbour_id] += CO_PURCHASE_WEIGHT
+
+
+def rebuild_related_index(product_ids, chunk_size=RELATED_CHUNK_SIZE):
+    """
+    Score each product's neighbours by shared authors, categories, tags and
+    co-purchases and store the top-K ids. Runs in chunks with a fixed
+    number of queries per chunk, so the catalog is never loaded at once.
+    """
+    top_k = getattr(settings, "RELATED_BOOKS_TOP_K", 12)
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), chunk_size):
+        chunk_ids = product_ids[start:start + chunk_size]
+        scores = {product_id: defaultdict(int) for product_id in chunk_ids}
+
+        for field, column, weight in SHARED_RELATIONS:
+            _shared_relation_scores(chunk_ids, field, column, weight, scores)
+        _co_purchase_scores(chunk_ids, scores)
+
+        indexes = [
+            ProductRelatedIndex(
+                product_id=product_id,
+                related_ids=[
+                    neighbour_id for neighbour_id, _ in
+                    sorted(neighbours.items(), key=lambda item: (-item[1], -item[0]))[:top_k]
+                ],
+            )
+            for product_id, neighbours in scores.items()
+        ]
+        bulk_upsert(ProductRelatedIndex, indexes, ["product"], ["related_ids", "updated_at"])
+
+
+def get_related_ids(product):
+    """ Read the stored related ids, building them on first use. """
+    try:
+        return product.related_index.related_ids
+    except ProductRelatedIndex.DoesNotExist:
+        rebuild_related_index([product.id])
+        return ProductRelatedIndex.objects.get(product_id=product.id).related_ids
@@ -0,0 +1,113 @@
+# search.py for catalog app
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import Value, FloatField, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Length, Replace
+from .models import Product, ProductSearchDocument
+from .upsert import bulk_upsert
+
+SEARCH_CHUNK_SIZE = 500
+# InnoDB's default FULLTEXT stopwords (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD)
+FULLTEXT_STOPWORDS = frozenset({
+    "a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en", "for", "from", "how", "i",
+    "in", "is", "it", "la", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when",
+    "where", "who", "will", "with", "und", "www",
+})
+
+
+def tokenize(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def build_search_document(product):
+    """ Flatten a product and its related names into one searchable text. """
+    parts = [product.title]
+    parts.extend(author.name for author in product.authors.all())
+    parts.extend(category.name for category in product.categories.all())
+    parts.extend(tag.name for tag in product.tags.all())
+    parts.append(product.isbn)
+    return " ".join(part for part in parts if part).lower()
+
+
+def refresh_search_documents(product_ids, chunk_size=SEARCH_CHUNK_SIZE):
+    """ Rebuild the search documents of the given products in chunks. """
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), chunk_size):
+        products = (
+            Product.objects
+            .filter(id__in=product_ids[start:start + chunk_size])
+            .only("id", "title", "isbn")
+            .prefetch_related("authors", "categories", "tags")
+        )
+        documents = [
+            ProductSearchDocument(product=product, document=build_search_document(product))
+            for product in products
+        ]
+        bulk_upsert(ProductSearchDocument, documents, ["product"], ["document", "updated_at"])
+
+
+def search_products(queryset, query):
+    """
+    Filter a product queryset down to the matches for `query` and annotate
+    each product with a `search_rank` relevance score.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+
+    if connection.vendor == "mysql":
+        return _fulltext_search(queryset, terms)
+    return _fallback_search(queryset, terms)
+
+
+def split_fulltext_terms(terms):
+    """
+    Split terms into those the FULLTEXT index holds and those it drops:
+    words shorter than innodb_ft_min_token_size and stopwords. A required
+    `+term*` for a dropped word matches no row at all.
+    """
+    min_size = getattr(settings, "SEARCH_FULLTEXT_MIN_TOKEN_SIZE", 3)
+    indexed = [term for term in terms if len(term) >= min_size and term not in FULLTEXT_STOPWORDS]
+    return indexed, [term for term in terms if term not in indexed]
+
+
+def _ranked(queryset, matches):
+    return queryset.filter(id__in=matches.values("product_id")).annotate(
+        search_rank=Subquery(
+            matches.filter(product_id=OuterRef("pk")).values("rank")[:1],
+            output_field=FloatField(),
+        )
+    )
+
+
+def _fulltext_search(queryset, terms):
+    indexed, unindexed = split_fulltext_terms(terms)
+    if not indexed:
+        return _fallback_search(queryset, terms)
+
+    # Every term is required and matched as a prefix, like the old icontains search
+    boolean_query = " ".join(f"+{term}*" for term in indexed)
+    matches = ProductSearchDocument.objects.annotate(
+        rank=RawSQL("MATCH (document) AGAINST (%s IN BOOLEAN MODE)", (boolean_query,))
+    ).filter(rank__gt=0)
+    # Words the index drops are still required, as substrings
+    for term in unindexed:
+        matches = matches.filter(document__icontains=term)
+    return _ranked(queryset, matches)
+
+
+def _occurrences(term):
+    # How often `term` appears in the (lowercase) document
+    return (Length("document") - Length(Replace("document", Value(term), Value("")))) / len(term)
+
+
+def _fallback_search(queryset, terms):
+    # Substring search ranked by term occurrences, in SQL, for databases
+    # without FULLTEXT support (SQLite test runs) and dropped-word queries
+    matches = ProductSearchDocument.objects.all()
+    for term in terms:
+        matches = matches.filter(document__icontains=term)
+    rank = sum((_occurrences(term) for term in terms[1:]), _occurrences(terms[0]))
+    return _ranked(queryset, matches.annotate(rank=Cast(rank, FloatField())))
@@ -1,41 +1,88 @@
 from rest_framework import serializers
-from .models import Author, Category, Publisher, Tag, Product, ProductImage, ProductRating
-from django.db.models import Avg, Count
-import random
+from django.conf import settings
+from .models import Author, Category, Publisher, Tag, Product, ProductImage, ProductRating, ProductRatingSummary
+from django.db.models import Sum
+from django.db.models.manager import BaseManager
+from .utils import attach_rating_stats, get_rating_stats, book_card_queryset
+from .related import get_related_ids
+from .featured import pick_featured_ids
+from .fieldsets import SparseFieldsetSerializerMixin
+from .images import image_srcset
+from .pagination import ReviewCursorPagination
+
+class AuthorSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    photo_srcset = serializers.SerializerMethodField()
 
-class AuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = "__all__"
 
-class CategorySerializer(serializers.ModelSerializer):
+    def get_photo_srcset(self, obj):
+        return image_srcset(obj.photo, self.context.get("request"))
+
+class CategorySerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     product_count = serializers.IntegerField(read_only=True)
+    icon_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
         fields = "__all__"
 
-class PublisherSerializer(serializers.ModelSerializer):
+    def get_icon_srcset(self, obj):
+        return image_srcset(obj.icon, self.context.get("request"))
+
+class CategoryTreeSerializer(serializers.ModelSerializer):
+    product_count = serializers.IntegerField(read_only=True)
+    total_product_count = serializers.IntegerField(read_only=True)
+    children = serializers.SerializerMethodField()
+    icon_srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Category
+        fields = ["id", "name", "slug", "icon", "icon_srcset", "level", "product_count", "total_product_count", "children"]
+
+    def get_icon_srcset(self, obj):
+        return image_srcset(obj.icon, self.context.get("request"))
+
+    def get_children(self, obj):
+        return CategoryTreeSerializer(obj.tree_children, many=True, context=self.context).data
+
+class PublisherSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Publisher
         fields = "__all__"
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = "__all__"
 
 
 class BookImageSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ["id", "image", "is_main", "created_at"]
+        fields = ["id", "image", "srcset", "is_main", "created_at"]
 
-class BookListSerializer(serializers.ModelSerializer):
+    def get_srcset(self, obj):
+        return image_srcset(obj.image, self.context.get("request"))
+
+class BookListListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, BaseManager) else data
+        # The per-score breakdown is the only field that needs the summaries,
+        # load them for the whole page in one query and only when requested
+        if "rating_counts" in self.child.fields:
+            iterable = attach_rating_stats(iterable)
+        return super().to_representation(iterable)
+
+class BookListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     categories = CategorySerializer(many=True, read_only=True)
     authors = AuthorSerializer(many=True, read_only=True)
     publisher = PublisherSerializer(read_only=True)
     main_image = serializers.SerializerMethodField()
+    main_image_srcset = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
     rating_counts = serializers.SerializerMethodField()
     rating_count = serializers.SerializerMethodField()
@@ -46,36 +93,33 @@ class BookListSerializer(serializers.ModelSerializer):
             "id", "title", "slug", "isbn", "price", "stock_quantity",
             "format_type", "physical_stock_status", "ebook_stock_status",
             "language", "ebook_file_size", "pages", "categories", "authors",
-            "publisher", "main_image", "average_rating", "rating_counts", "rating_count"
+            "publisher", "main_image", "main_image_srcset", "average_rating", "rating_counts", "rating_count"
         ]
+        list_serializer_class = BookListListSerializer
 
     def get_main_image(self, obj):
         request = self.context.get('request')
-        main_img = obj.images.filter(is_main=True).first()
-        if main_img and main_img.image:
-            return request.build_absolute_uri(main_img.image.url)
+        if obj.main_image:
+            return request.build_absolute_uri(obj.main_image.url)
         return None
 
+    def get_main_image_srcset(self, obj):
+        return image_srcset(obj.main_image, self.context.get("request"))
+
     def get_average_rating(self, obj):
-        avg = obj.average_rating
+        avg = obj.avg_rating
         if avg is None:
             return 0
         return int(avg) if avg == int(avg) else round(avg, 1)
 
     def get_rating_counts(self, obj):
-        return {
-            "1": ProductRating.objects.filter(product=obj, score=1).count(),
-            "2": ProductRating.objects.filter(product=obj, score=2).count(),
-            "3": ProductRating.objects.filter(product=obj, score=3).count(),
-            "4": ProductRating.objects.filter(product=obj, score=4).count(),
-            "5": ProductRating.objects.filter(product=obj, score=5).count(),
-        }
-
+        counts = get_rating_stats(obj)["counts"]
+        return {str(score): total for score, total in counts.items()}
 
     def get_rating_count(self, obj):
-        return ProductRating.objects.filter(product=obj).distinct().count()
+        return obj.rating_count
 
-class ProductRatingSerializer(serializers.ModelSerializer):
+class ProductRatingSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     user_first_name = serializers.CharField(source="user.first_name", read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
 
@@ -92,21 +136,14 @@ class ProductRatingSerializer(serializers.ModelSerializer):
     @classmethod
     def get_rating_counts(cls):
         """Returns counts of ratings from 1 to 5 as a dictionary."""
-        counts = (
-            ProductRating.objects
-            .values("score")
-            .annotate(product_count=Count("id"))
+        totals = ProductRatingSummary.objects.aggregate(
+            **{str(rating): Sum(f"score_{rating}") for rating in range(1, 6)}
         )
 
         # Create dict with all ratings 1–5, default 0
-        count_map = {str(rating): 0 for rating in range(1, 6)}
-
-        for c in counts:
-            count_map[str(c["score"])] = c["product_count"]
-
-        return count_map
+        return {rating: count or 0 for rating, count in totals.items()}
 
-class BookDetailSerializer(serializers.ModelSerializer):
+class BookDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     categories = CategorySerializer(many=True, read_only=True)
     authors = AuthorSerializer(many=True, read_only=True)
     publisher = PublisherSerializer(read_only=True)
@@ -116,57 +153,50 @@ class BookDetailSerializer(serializers.ModelSerializer):
     rating_counts = serializers.SerializerMethodField()
     total_rating_count = serializers.SerializerMethodField()
     related_books = serializers.SerializerMethodField()
-    reviews = ProductRatingSerializer(many=True, read_only=True, source="ratings")
+    reviews = serializers.SerializerMethodField()
+    main_image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = "__all__"
 
     def get_average_rating(self, obj):
-        return obj.average_rating
+        return get_rating_stats(obj)["average"]
     
     def get_rating_counts(self, obj):
-        counts = (
+        return dict(get_rating_stats(obj)["counts"])
+
+    def get_total_rating_count(self, obj):
+        return get_rating_stats(obj)["count"]
+    
+    def get_main_image_srcset(self, obj):
+        return image_srcset(obj.main_image, self.context.get("request"))
+
+    def get_reviews(self, obj):
+        # Only the newest reviews are embedded, the full list is paginated on its own endpoint
+        limit = getattr(settings, "BOOK_DETAIL_REVIEWS_LIMIT", 5)
+        reviews = (
             ProductRating.objects
             .filter(product=obj)
-            .values("score")
-            .annotate(product_count=Count("id"))
+            .select_related("user")
+            # Same order as the reviews endpoint's cursor, so clients can page on from here
+            .order_by(*ReviewCursorPagination.default_ordering, "id")[:limit]
         )
-        count_map = {rating: 0 for rating in range(1, 6)}
-        for c in counts:
-            count_map[int(c["score"])] = c["product_count"]
-        return count_map
+        # The detail's fieldset does not apply to the embedded reviews
+        return ProductRatingSerializer(reviews, many=True, context={"request": self.context.get("request")}).data
 
-    def get_total_rating_count(self, obj):
-        total = ProductRating.objects.filter(product=obj).count()
-        return total or 0
-    
     def get_related_books(self, obj):
-        related_books = []
-
-        # Same categories
-        category_books = Product.objects.filter(
-            categories__in=obj.categories.all()
-        ).exclude(id=obj.id).distinct()
-        related_books.extend(list(category_books))
-
-        # Same tags
-        if len(related_books) < 4 and obj.tags.exists():
-            tag_books = Product.objects.filter(
-                tags__in=obj.tags.all()
-            ).exclude(id__in=[p.id for p in related_books] + [obj.id]).distinct()
-            related_books.extend(list(tag_books))
-
-        # Random fallback
+        # Precomputed neighbours, topped up from the featured pool when too few of them still load
+        related_ids = [product_id for product_id in get_related_ids(obj) if product_id != obj.id]
+        books = book_card_queryset().in_bulk(related_ids)
+        related_books = [books[product_id] for product_id in related_ids if product_id in books][:4]
+
         if len(related_books) < 4:
-            remaining_books = Product.objects.exclude(
-                id__in=[p.id for p in related_books] + [obj.id]
-            )
-            remaining_count = min(4 - len(related_books), remaining_books.count())
-            if remaining_count > 0:
-                related_books.extend(random.sample(list(remaining_books), remaining_count))
-
-        # Limit to 4 and serialize using BookListSerializer
-        serializer = BookListSerializer(related_books[:4], many=True, context=self.context)
-        return serializer.data
+            taken = {obj.id, *(book.id for book in related_books)}
+            fallback_ids = [product_id for product_id in pick_featured_ids(count=8) if product_id not in taken]
+            fallback = book_card_queryset().in_bulk(fallback_ids)
+            related_books += [fallback[product_id] for product_id in fallback_ids if product_id in fallback][:4 - len(related_books)]
 
+        # The detail's fieldset does not apply to the nested cards
+        serializer = BookListSerializer(related_books, many=True, context={"request": self.context.get("request")})
+        return serializer.data
@@ -1 +1,141 @@
 # signals.py for catalog app
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from .models import Author, Category, Publisher, Tag, Product, ProductImage, ProductRating, ProductRatingSummary, FeaturedProduct
+from .search import refresh_search_documents
+from .related import rebuild_related_index
+from .images import generate_derivatives
+from .cache import bump_version_on_commit
+
+# Models whose writes bump the response cache version counters
+CACHE_VERSIONED_MODELS = (Author, Category, Publisher, Tag, Product, ProductImage, ProductRating, FeaturedProduct)
+
+@receiver(post_save, sender=Product)
+def create_rating_summary(sender, instance, created, **kwargs):
+    if created:
+        ProductRatingSummary.objects.get_or_create(product=instance)
+
+@receiver(pre_save, sender=ProductRating)
+def remember_previous_rating(sender, instance, **kwargs):
+    # Keep the stored product/score so an edit can be moved in the summary
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = (
+            ProductRating.objects
+            .filter(pk=instance.pk)
+            .values_list("product_id", "score")
+            .first()
+        )
+
+@receiver(post_save, sender=ProductRating)
+def update_rating_summary_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_rating", None)
+    if previous == (instance.product_id, instance.score):
+        return
+    if previous:
+        ProductRatingSummary.apply_rating_change(previous[0], previous[1], -1)
+    ProductRatingSummary.apply_rating_change(instance.product_id, instance.score, 1)
+
+@receiver(post_delete, sender=ProductRating)
+def update_rating_summary_on_delete(sender, instance, **kwargs):
+    ProductRatingSummary.apply_rating_change(instance.product_id, instance.score, -1)
+
+@receiver(post_delete, sender=ProductImage)
+def replace_deleted_main_image(sender, instance, **kwargs):
+    if not instance.is_main:
+        return
+    replacement = ProductImage.objects.filter(book_id=instance.book_id).order_by("id").first()
+    if replacement:
+        # Saving promotes it to main and updates Product.main_image
+        replacement.save()
+    else:
+        Product.objects.filter(pk=instance.book_id).update(main_image=None)
+
+@receiver(post_save, sender=Product)
+def refresh_product_search_document(sender, instance, **kwargs):
+    refresh_search_documents([instance.id])
+
+@receiver(m2m_changed, sender=Product.authors.through)
+@receiver(m2m_changed, sender=Product.categories.through)
+@receiver(m2m_changed, sender=Product.tags.through)
+def refresh_search_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear", "pre_clear"):
+        return
+    if not reverse:
+        if action != "pre_clear":
+            refresh_search_documents([instance.pk])
+        return
+    # Reverse side (e.g. author.books.add(...)): refresh every affected product
+    if action == "pre_clear":
+        instance._cleared_book_ids = list(instance.books.values_list("id", flat=True))
+    elif action == "post_clear":
+        refresh_search_documents(getattr(instance, "_cleared_book_ids", []))
+    else:
+        refresh_search_documents(pk_set or [])
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+def refresh_search_on_name_change(sender, instance, created, **kwargs):
+    if not created:
+        refresh_search_documents(instance.books.values_list("id", flat=True))
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Tag)
+def remember_books_before_delete(sender, instance, **kwargs):
+    instance._search_book_ids = list(instance.books.values_list("id", flat=True))
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Tag)
+def refresh_search_on_delete(sender, instance, **kwargs):
+    refresh_search_documents(getattr(instance, "_search_book_ids", []))
+
+def bump_catalog_cache_version(sender, **kwargs):
+    bump_version_on_commit(sender)
+
+# Connected per model, so saves of unrelated models never reach the receiver
+for model in CACHE_VERSIONED_MODELS:
+    post_save.connect(bump_catalog_cache_version, sender=model)
+    post_delete.connect(bump_catalog_cache_version, sender=model)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_reviewer_version(sender, update_fields=None, **kwargs):
+    # Reviews show the reviewer's first name; logins only save last_login
+    if update_fields is None or "first_name" in update_fields:
+        bump_version_on_commit(User)
+
+@receiver(m2m_changed)
+def bump_catalog_cache_version_on_m2m(sender, action, **kwargs):
+    if action.startswith("post_") and sender in (
+        Product.authors.through, Product.categories.through, Product.tags.through
+    ):
+        bump_version_on_commit(Product)
+        if sender is Product.categories.through:
+            bump_version_on_commit(sender)
+
+@receiver(post_delete, sender=Product)
+def bump_category_membership_version(sender, **kwargs):
+    # Deleting a book drops its category rows without any m2m signal
+    bump_version_on_commit(Product.categories.through)
+
+@receiver(m2m_changed, sender=Product.authors.through)
+@receiver(m2m_changed, sender=Product.categories.through)
+@receiver(m2m_changed, sender=Product.tags.through)
+def refresh_related_on_m2m_change(sender, instance, action, reverse, **kwargs):
+    # Incremental update for the edited book; neighbours catch up on the next full rebuild
+    if not reverse and action in ("post_add", "post_remove", "post_clear"):
+        rebuild_related_index([instance.pk])
+
+# Image field of each model whose uploads get resized derivatives
+IMAGE_FIELDS = {ProductImage: "image", Category: "icon", Author: "photo"}
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Author)
+def generate_image_derivatives(sender, instance, **kwargs):
+    # Up-to-date derivatives are skipped, so plain re-saves only cost a stat call
+    generate_derivatives(getattr(instance, IMAGE_FIELDS[sender]).name)
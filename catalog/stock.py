@@ -0,0 +1,48 @@
+# stock.py for catalog app
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .cache import invalidate_bulk_writes
+from .models import Product
+
+
+def stock_status_rules(today):
+    """
+    (field, status, condition) for every derived stock status, the rules
+    Product.update_stock_status applies to one instance.
+    """
+    physical = Q(format_type__in=Product.PHYSICAL_FORMATS)
+    ebook = Q(format_type__in=Product.EBOOK_FORMATS)
+    return [
+        ("physical_stock_status", "out_of_stock", physical & Q(stock_quantity=0)),
+        ("physical_stock_status", "low_stock", physical & Q(stock_quantity__gt=0, stock_quantity__lte=Product.LOW_STOCK_THRESHOLD)),
+        ("physical_stock_status", "in_stock", physical & Q(stock_quantity__gt=Product.LOW_STOCK_THRESHOLD)),
+        ("ebook_stock_status", "pre_order", ebook & Q(publication_date__gt=today)),
+        ("ebook_stock_status", "available", ebook & Q(publication_date__lte=today)),
+    ]
+
+
+def reconcile_stock_status(queryset=None):
+    """
+    Bring the stored stock statuses in line with the rules using one
+    UPDATE per rule, touching only rows whose status is wrong. Returns
+    the number of rows changed per "field:status". Pass a queryset to
+    reconcile part of the catalog, e.g. rows just written in bulk.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+
+    now = timezone.now()
+    changed = {}
+    with transaction.atomic():
+        for field, status, condition in stock_status_rules(timezone.localdate()):
+            changed[f"{field}:{status}"] = (
+                queryset
+                .filter(condition)
+                .exclude(**{field: status})
+                .update(**{field: status, "updated_at": now})
+            )
+
+    if any(changed.values()):
+        invalidate_bulk_writes(Product)
+    return changed
@@ -0,0 +1,20 @@
+# testing.py for catalog app
+from datetime import date
+from .models import Product
+
+
+class BookFactoryMixin:
+    """ Builds valid books for tests; `index` keeps titles, slugs and ISBNs unique. """
+
+    @classmethod
+    def create_book(cls, index, **kwargs):
+        defaults = {
+            "title": f"Book {index}",
+            "isbn": f"978000000{index:04d}",
+            "price": "10.00",
+            "stock_quantity": 10,
+            "pages": 100,
+            "publication_date": date(2020, 1, 1),
+        }
+        defaults.update(kwargs)
+        return Product.objects.create(**defaults)
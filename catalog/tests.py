@@ -1,3 +1,1240 @@
-from django.test import TestCase
+from django.test import TestCase, tag, override_settings
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from urllib.parse import urlparse, parse_qs
+from auth_core.models import Application
+from auth_core.testing import SignedRequestMixin
+from django.core.management import call_command
+from django.apps import apps
+from importlib import import_module
+from io import StringIO, BytesIO
+import json
+import os
+import tempfile
+from .testing import BookFactoryMixin
+from .cache import get_cache, get_cache_stats, get_versions, bump_version
+from .featured import refresh_featured_pool, pick_featured_ids, get_featured_pool
+from .related import rebuild_related_index, get_related_ids
+from .stock import reconcile_stock_status
+from .search import split_fulltext_terms
+from .discounts import resolve_discounts, clear_discount_index
+from .models import Discount
+from decimal import Decimal
+from .images import derivative_name, IMAGE_SIZES, IMAGE_FORMATS
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+import shutil
+from .models import Author, Category, Tag, Product, FeaturedProduct, ProductImage, ProductRating, ProductRatingSummary, ProductSearchDocument, ProductRelatedIndex
+from datetime import timedelta
+from django.utils import timezone
+from unittest import skipUnless, mock
+from rest_framework.renderers import JSONRenderer
+from auth_core.renderers import FastJSONRenderer, MessagePackRenderer, msgpack
+import re
+import time
 
-# Create your tests here.
+
+# Timing comparisons are opt-in, they are slow and machine dependent
+run_benchmarks = skipUnless(os.environ.get("RUN_BENCHMARKS"), "set RUN_BENCHMARKS=1 to run benchmarks")
+
+
+class CatalogAPITestCase(SignedRequestMixin, BookFactoryMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.api_key = cls.create_api_key()
+        cls.author = Author.objects.create(name="Chinua Achebe")
+        cls.category = Category.objects.create(name="Fiction")
+
+    def setUp(self):
+        # Cached responses outlive the per-test rollback
+        get_cache().clear()
+
+    @classmethod
+    def create_book(cls, index, **kwargs):
+        book = super().create_book(index, **kwargs)
+        book.authors.add(cls.author)
+        book.categories.add(cls.category)
+        return book
+
+    @classmethod
+    def create_user(cls, index):
+        return User.objects.create_user(username=f"reader{index}", password="secret-pass")
+
+
+class BookListRatingQueryTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.users = [cls.create_user(i) for i in range(3)]
+        cls.books = [cls.create_book(i) for i in range(8)]
+        for book in cls.books:
+            for user, score in zip(cls.users, (5, 4, 4)):
+                ProductRating.objects.create(user=user, product=book, score=score)
+
+    def rating_queries(self, page_size, table):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.signed_get("/api/catalog/books/", {"page_size": page_size})
+        self.assertEqual(response.status_code, 200)
+        pattern = re.compile(rf"\b{table}\b")
+        return [q for q in ctx.captured_queries if pattern.search(q["sql"])]
+
+    def test_rating_queries_do_not_grow_with_page_size(self):
+        self.assertEqual(len(self.rating_queries(2, "catalog_productratingsummary")), 1)
+        self.assertEqual(len(self.rating_queries(8, "catalog_productratingsummary")), 1)
+
+    def test_list_does_not_scan_ratings(self):
+        self.assertEqual(self.rating_queries(8, "catalog_productrating"), [])
+
+    def test_rating_values(self):
+        response = self.signed_get("/api/catalog/books/", {"page_size": 1})
+        book = response.json()["results"][0]
+        self.assertEqual(book["rating_count"], 3)
+        self.assertEqual(book["rating_counts"], {"1": 0, "2": 0, "3": 0, "4": 2, "5": 1})
+        self.assertEqual(book["average_rating"], 4.3)
+
+
+class ProductRatingSummaryTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.users = [cls.create_user(i) for i in range(3)]
+        cls.book = cls.create_book(1)
+        cls.other_book = cls.create_book(2)
+
+    def assertSummary(self, book, count, total, counts):
+        summary = ProductRatingSummary.objects.get(product=book)
+        self.assertEqual(summary.rating_count, count)
+        self.assertEqual(summary.rating_sum, total)
+        self.assertEqual(summary.score_counts, counts)
+        self.assertAlmostEqual(summary.average_rating, total / count if count else 0)
+
+    def test_summary_follows_create_update_delete(self):
+        first = ProductRating.objects.create(user=self.users[0], product=self.book, score=5)
+        ProductRating.objects.create(user=self.users[1], product=self.book, score=2)
+        self.assertSummary(self.book, 2, 7, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+
+        first.score = 3
+        first.save()
+        self.assertSummary(self.book, 2, 5, {1: 0, 2: 1, 3: 1, 4: 0, 5: 0})
+
+        first.delete()
+        self.assertSummary(self.book, 1, 2, {1: 0, 2: 1, 3: 0, 4: 0, 5: 0})
+
+    def test_rebuild_command(self):
+        ProductRating.objects.create(user=self.users[0], product=self.book, score=4)
+        ProductRating.objects.create(user=self.users[1], product=self.book, score=1)
+        ProductRatingSummary.objects.all().delete()
+
+        call_command("rebuild_rating_summaries", chunk_size=1, stdout=StringIO())
+
+        self.assertSummary(self.book, 2, 5, {1: 1, 2: 0, 3: 0, 4: 1, 5: 0})
+        self.assertSummary(self.other_book, 0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0})
+
+    def test_delete_without_summary_rebuilds_it(self):
+        ProductRating.objects.create(user=self.users[0], product=self.book, score=4)
+        rating = ProductRating.objects.create(user=self.users[1], product=self.book, score=1)
+        ProductRatingSummary.objects.all().delete()
+        rating.delete()
+        self.assertSummary(self.book, 1, 4, {1: 0, 2: 0, 3: 0, 4: 1, 5: 0})
+
+    def test_migration_backfills_summaries_in_chunks(self):
+        migration = import_module("catalog.migrations.0007_productratingsummary")
+        ProductRating.objects.create(user=self.users[0], product=self.book, score=4)
+        ProductRating.objects.create(user=self.users[1], product=self.book, score=1)
+        ProductRatingSummary.objects.all().delete()
+
+        with mock.patch.object(migration, "BACKFILL_CHUNK_SIZE", 1):
+            migration.backfill_rating_summaries(apps, None)
+
+        self.assertSummary(self.book, 2, 5, {1: 1, 2: 0, 3: 0, 4: 1, 5: 0})
+        self.assertSummary(self.other_book, 0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0})
+
+    def test_migration_copies_totals_from_ratings(self):
+        migration = import_module("catalog.migrations.0011_product_avg_rating_rating_count")
+        ProductRating.objects.create(user=self.users[0], product=self.book, score=4)
+        ProductRating.objects.create(user=self.users[1], product=self.book, score=1)
+        ProductRatingSummary.objects.all().delete()
+        Product.objects.update(avg_rating=0, rating_count=0)
+
+        migration.copy_rating_totals(apps, None)
+
+        self.book.refresh_from_db()
+        self.other_book.refresh_from_db()
+        self.assertEqual((self.book.avg_rating, self.book.rating_count), (2.5, 2))
+        self.assertEqual((self.other_book.avg_rating, self.other_book.rating_count), (0, 0))
+
+    def test_rebuild_omits_conflict_target_where_unsupported(self):
+        # MySQL cannot name the conflict column of ON DUPLICATE KEY UPDATE
+        with mock.patch.object(connection.features, "supports_update_conflicts_with_target", False), \
+                mock.patch.object(ProductRatingSummary.objects, "bulk_create") as bulk_create:
+            ProductRatingSummary.rebuild_for_products([self.book.id])
+        self.assertIsNone(bulk_create.call_args.kwargs["unique_fields"])
+        self.assertTrue(bulk_create.call_args.kwargs["update_conflicts"])
+
+    def test_product_columns_follow_ratings(self):
+        rating = ProductRating.objects.create(user=self.users[0], product=self.book, score=5)
+        ProductRating.objects.create(user=self.users[1], product=self.book, score=2)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.avg_rating, self.book.rating_count), (3.5, 2))
+
+        # A stale instance saved later must not overwrite the counters
+        stale = Product.objects.get(pk=self.book.pk)
+        rating.delete()
+        stale.title = "Renamed"
+        stale.save()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.title, self.book.avg_rating, self.book.rating_count), ("Renamed", 2.0, 1))
+
+    def test_order_by_average_rating_and_popularity(self):
+        ProductRating.objects.create(user=self.users[0], product=self.book, score=2)
+        ProductRating.objects.create(user=self.users[0], product=self.other_book, score=4)
+        ProductRating.objects.create(user=self.users[1], product=self.other_book, score=5)
+
+        for order, expected in (
+            ("-average_rating", [self.other_book, self.book]),
+            ("average_rating", [self.book, self.other_book]),
+            ("-popularity", [self.other_book, self.book]),
+        ):
+            response = self.signed_get("/api/catalog/books/", {"order_by": order})
+            self.assertEqual([book["slug"] for book in response.json()["results"]], [book.slug for book in expected])
+
+    def test_rating_filter_uses_summary(self):
+        ProductRating.objects.create(user=self.users[0], product=self.book, score=5)
+        response = self.signed_get("/api/catalog/books/", {"rating": 4})
+        slugs = [book["slug"] for book in response.json()["results"]]
+        self.assertEqual(slugs, [self.other_book.slug])
+
+
+class BookCardImageTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.books = [cls.create_book(i) for i in range(8)]
+        for book in cls.books:
+            ProductImage.objects.create(book=book, image=f"books/images/{book.slug}.jpg")
+            ProductImage.objects.create(book=book, image=f"books/images/{book.slug}-back.jpg")
+
+    def count_queries(self, page_size):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.signed_get("/api/catalog/books/", {"page_size": page_size})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_book_list_query_count_is_constant(self):
+        self.assertEqual(self.count_queries(2), self.count_queries(8))
+
+    def test_main_image_is_cached_on_product(self):
+        book = self.books[0]
+        book.refresh_from_db()
+        self.assertEqual(book.main_image.name, f"books/images/{book.slug}.jpg")
+
+        back = book.images.get(is_main=False)
+        back.is_main = True
+        back.save()
+        book.refresh_from_db()
+        self.assertEqual(book.main_image.name, back.image.name)
+
+        back.delete()
+        book.refresh_from_db()
+        self.assertEqual(book.main_image.name, f"books/images/{book.slug}.jpg")
+        self.assertTrue(book.images.get().is_main)
+
+
+class BookSearchTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.novel = cls.create_book(1, title="Things Fall Apart")
+        cls.poetry = cls.create_book(2, title="Collected Poems")
+        cls.poetry.categories.set([Category.objects.create(name="Poetry")])
+        cls.poetry.tags.add(Tag.objects.create(name="Classic"))
+        cls.poetry.authors.set([Author.objects.create(name="Wole Soyinka")])
+
+    def search(self, query):
+        response = self.signed_get("/api/catalog/books/", {"search": query})
+        self.assertEqual(response.status_code, 200)
+        return [book["slug"] for book in response.json()["results"]]
+
+    def test_search_matches_title_author_category_tag_and_isbn(self):
+        self.assertEqual(self.search("things fall"), [self.novel.slug])
+        self.assertEqual(self.search("soyin"), [self.poetry.slug])
+        self.assertEqual(self.search("poetry"), [self.poetry.slug])
+        self.assertEqual(self.search("classic"), [self.poetry.slug])
+        self.assertEqual(self.search(self.novel.isbn), [self.novel.slug])
+        self.assertEqual(self.search("achebe"), [self.novel.slug])
+
+    def test_documents_follow_related_changes(self):
+        self.author.name = "Albert Chinualumogu Achebe"
+        self.author.save()
+        self.assertEqual(self.search("albert"), [self.novel.slug])
+
+        self.author.books.add(self.poetry)
+        self.assertEqual(
+            sorted(ProductSearchDocument.objects.filter(document__contains="albert").values_list("product_id", flat=True)),
+            sorted([self.novel.id, self.poetry.id]),
+        )
+
+    def test_migration_backfills_documents_in_chunks(self):
+        migration = import_module("catalog.migrations.0009_productsearchdocument")
+        expected = dict(ProductSearchDocument.objects.values_list("product_id", "document"))
+        ProductSearchDocument.objects.all().delete()
+
+        with mock.patch.object(migration, "BACKFILL_CHUNK_SIZE", 1):
+            migration.backfill_search_documents(apps, None)
+
+        self.assertEqual(dict(ProductSearchDocument.objects.values_list("product_id", "document")), expected)
+        self.assertEqual(self.search("soyin"), [self.poetry.slug])
+
+    def test_results_are_ranked_by_relevance(self):
+        self.create_book(3, title="Fiction about Fiction")
+        slugs = self.search("fiction")
+        self.assertEqual(slugs[0], "fiction-about-fiction")
+
+    def test_matches_are_not_capped(self):
+        books = Product.objects.bulk_create([
+            Product(title=f"Filler {index}", slug=f"filler-{index}", isbn=f"979{index:010d}", price=1, pages=1)
+            for index in range(1100)
+        ])
+        ProductSearchDocument.objects.bulk_create([
+            ProductSearchDocument(product=book, document=f"filler {book.title.lower()} zebra") for book in books
+        ])
+        ProductSearchDocument.objects.filter(product=books[-1]).update(document="filler zebra zebra")
+        response = self.signed_get("/api/catalog/books/", {"search": "zebra", "page_size": 5})
+        self.assertEqual(response.json()["count"], 1100)
+        self.assertEqual(response.json()["results"][0]["slug"], "filler-1099")
+
+    def test_fulltext_terms_the_index_drops_are_kept_apart(self):
+        self.assertEqual(split_fulltext_terms(["the", "go", "things", "fall"]), (["things", "fall"], ["the", "go"]))
+
+
+class BookCursorPaginationTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.books = [cls.create_book(i, price=f"{10 + i % 3}.00") for i in range(10)]
+
+    def walk(self, params):
+        slugs = []
+        params = dict(params, pagination="cursor", page_size=3)
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.signed_get("/api/catalog/books/", params)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse([q for q in ctx.captured_queries if "COUNT(" in q["sql"].upper()])
+            data = response.json()
+            slugs.extend(book["slug"] for book in data["results"])
+            if not data["next"]:
+                return slugs
+            params["cursor"] = parse_qs(urlparse(data["next"]).query)["cursor"][0]
+
+    def test_walks_every_book_once_with_ties(self):
+        expected = [book.slug for book in Product.objects.order_by("-price", "id")]
+        self.assertEqual(self.walk({"order_by": "-price"}), expected)
+
+    def test_default_ordering(self):
+        expected = [book.slug for book in Product.objects.order_by("-created_at", "id")]
+        self.assertEqual(self.walk({}), expected)
+
+    def test_invalid_cursor(self):
+        response = self.signed_get("/api/catalog/books/", {"pagination": "cursor", "cursor": "bogus"})
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogResponseCacheTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.book = cls.create_book(1)
+
+    def test_only_versioned_models_bump_versions(self):
+        with mock.patch("catalog.signals.bump_version_on_commit") as bump:
+            Application.objects.create(name="Other App")
+            self.assertFalse(bump.called)
+            Tag.objects.create(name="Classic")
+        bump.assert_called_once_with(Tag)
+
+    def test_versions_are_bumped_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="Classic")
+            # A miss here would cache rows other connections cannot see yet
+            before_commit = get_versions([Tag])
+        self.assertNotEqual(get_versions([Tag]), before_commit)
+
+    def test_repeated_request_is_served_from_cache(self):
+        self.signed_get("/api/catalog/books/", {"page_size": 5})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.signed_get("/api/catalog/books/", {"page_size": 5})
+        self.assertEqual(response.json()["count"], 1)
+        self.assertFalse([q for q in ctx.captured_queries if "catalog_product" in q["sql"]])
+        self.assertEqual(get_cache_stats()["hits"], 1)
+        self.assertEqual(get_cache_stats()["misses"], 1)
+
+    def test_writes_invalidate_cached_responses(self):
+        self.assertEqual(self.signed_get("/api/catalog/books/").json()["count"], 1)
+        self.create_book(2)
+        self.assertEqual(self.signed_get("/api/catalog/books/").json()["count"], 2)
+
+        detail = f"/api/catalog/books/{self.book.slug}/"
+        self.assertEqual(self.signed_get(detail).json()["title"], "Book 1")
+        self.book.title = "Renamed"
+        self.book.save()
+        self.assertEqual(self.signed_get(detail).json()["title"], "Renamed")
+
+    def test_repeated_order_by_values_keep_their_order(self):
+        self.book.delete()
+        self.create_book(1, title="A", slug="a-5", price=Decimal("5.00"))
+        self.create_book(2, title="A", slug="a-20", price=Decimal("20.00"))
+        self.create_book(3, title="B", slug="b-10", price=Decimal("10.00"))
+
+        def listing(*orders):
+            response = self.signed_get("/api/catalog/books/", {"order_by": list(orders)})
+            return response, [(book["title"], book["price"]) for book in response.json()["results"]]
+
+        by_title, titles = listing("title", "price")
+        by_price, prices = listing("price", "title")
+        self.assertEqual(titles, [("A", "5.00"), ("A", "20.00"), ("B", "10.00")])
+        self.assertEqual(prices, [("A", "5.00"), ("B", "10.00"), ("A", "20.00")])
+        self.assertNotEqual(by_title["ETag"], by_price["ETag"])
+
+    def test_m2m_changes_invalidate_category_list(self):
+        self.assertEqual(len(self.signed_get("/api/catalog/categories/").json()), 1)
+        self.book.categories.add(Category.objects.create(name="History"))
+        self.assertEqual(len(self.signed_get("/api/catalog/categories/").json()), 2)
+
+
+class CategorySubtreeFilterTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.african = Category.objects.create(name="African Fiction", parent=cls.category)
+        cls.nigerian = Category.objects.create(name="Nigerian Fiction", parent=cls.african)
+        cls.science = Category.objects.create(name="Science")
+
+        cls.top_book = cls.create_book(1)
+        cls.deep_book = cls.create_book(2)
+        cls.deep_book.categories.set([cls.nigerian, cls.african])
+        cls.science_book = cls.create_book(3)
+        cls.science_book.categories.set([cls.science])
+
+    def filter_slugs(self, category):
+        response = self.signed_get("/api/catalog/books/", {"category": category})
+        self.assertEqual(response.status_code, 200)
+        return sorted(book["slug"] for book in response.json()["results"])
+
+    def test_parent_category_includes_descendants(self):
+        self.assertEqual(self.filter_slugs(self.category.slug), sorted([self.top_book.slug, self.deep_book.slug]))
+        self.assertEqual(self.filter_slugs(self.african.slug), [self.deep_book.slug])
+
+    def test_several_categories(self):
+        self.assertEqual(
+            self.filter_slugs(f"{self.nigerian.slug},{self.science.slug}"),
+            sorted([self.deep_book.slug, self.science_book.slug]),
+        )
+
+    def test_unknown_category(self):
+        self.assertEqual(self.filter_slugs("missing"), [])
+
+
+class BookFacetsTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_book(1, format_type="physical", price="8.00", language="en")
+        cls.create_book(2, format_type="ebook", price="15.00", language="fr", pages=10)
+        cls.create_book(3, format_type="both", price="15.00", language="en")
+        history = Category.objects.create(name="History")
+        cls.create_book(4, format_type="physical", price="120.00", language="de").categories.set([history])
+
+    def facets(self, params=None):
+        response = self.signed_get("/api/catalog/books/facets/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counts_without_filters(self):
+        facets = self.facets()
+        self.assertEqual(facets["format_type"], {"physical": 3, "ebook": 2, "both": 1})
+        self.assertEqual(facets["price"], {"0-10": 1, "10-20": 2, "20-50": 0, "50-100": 0, "100+": 1})
+        self.assertEqual(facets["language"]["en"], 2)
+        self.assertEqual(facets["rating"]["5"], 4)
+        self.assertEqual(
+            [(c["slug"], c["product_count"]) for c in facets["category"]],
+            [("fiction", 3), ("history", 1)],
+        )
+
+    def test_each_facet_ignores_its_own_filter(self):
+        facets = self.facets({"format_type": "ebook", "language": "en"})
+        # format counts only apply the language filter
+        self.assertEqual(facets["format_type"], {"physical": 2, "ebook": 1, "both": 1})
+        # language counts only apply the format filter
+        self.assertEqual(facets["language"]["en"], 1)
+        self.assertEqual(facets["language"]["fr"], 1)
+        # other facets apply both
+        self.assertEqual(facets["price"]["10-20"], 1)
+        self.assertEqual([(c["slug"], c["product_count"]) for c in facets["category"]], [("fiction", 1)])
+
+    def test_facets_match_list_results(self):
+        count = self.signed_get("/api/catalog/books/", {"format_type": "physical"}).json()["count"]
+        self.assertEqual(self.facets()["format_type"]["physical"], count)
+
+
+class ConditionalGetTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.book = cls.create_book(1)
+        cls.detail = f"/api/catalog/books/{cls.book.slug}/"
+
+    def test_matching_etag_returns_304_without_catalog_queries(self):
+        etag = self.signed_get(self.detail)["ETag"]
+        self.assertTrue(etag)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.signed_get(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if "catalog_" in q["sql"]])
+
+    def test_etag_changes_with_catalog_writes_and_params(self):
+        list_etag = self.signed_get("/api/catalog/books/")["ETag"]
+        self.assertNotEqual(self.signed_get("/api/catalog/books/", {"page_size": 2})["ETag"], list_etag)
+
+        detail_etag = self.signed_get(self.detail)["ETag"]
+        self.author.name = "Renamed"
+        self.author.save()
+        response = self.signed_get(self.detail, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], detail_etag)
+        self.assertEqual(self.signed_get("/api/catalog/books/", HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+    def test_last_modified_revalidation(self):
+        last_modified = self.signed_get(self.detail)["Last-Modified"]
+        self.assertTrue(last_modified)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.signed_get(self.detail, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if "catalog_" in q["sql"]])
+
+        self.author.name = "Renamed"
+        self.author.save()
+        self.assertEqual(self.signed_get(self.detail, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+
+@tag("benchmark")
+@run_benchmarks
+class ConditionalGetBenchmark(CatalogAPITestCase):
+    """ Compares a full book list render with a 304 revalidation. """
+    iterations = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(24):
+            cls.create_book(index)
+
+    def measure(self, clear_cache, **headers):
+        timings, queries = [], []
+        for _ in range(self.iterations):
+            if clear_cache:
+                get_cache().clear()
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = self.signed_get("/api/catalog/books/", {"page_size": 24}, **headers)
+                timings.append(time.perf_counter() - start)
+            queries.append(len(ctx.captured_queries))
+        return response, sorted(timings)[len(timings) // 2], max(queries)
+
+    def test_304_path_is_cheaper_than_full_render(self):
+        full, full_time, full_queries = self.measure(clear_cache=True)
+        etag = full["ETag"]
+        revalidated, revalidated_time, revalidated_queries = self.measure(False, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertLess(revalidated_queries, full_queries)
+        self.assertLess(revalidated_time, full_time)
+
+
+class FeaturedPoolTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.books = [cls.create_book(i) for i in range(10)]
+        cls.uncategorized = cls.create_book(99)
+        cls.uncategorized.categories.clear()
+
+    def test_pool_is_built_from_top_categories(self):
+        self.assertEqual(refresh_featured_pool(), 10)
+        pooled = set(FeaturedProduct.objects.values_list("product_id", flat=True))
+        self.assertEqual(pooled, {book.id for book in self.books})
+
+    def test_pinned_books_come_first_and_picks_are_distinct(self):
+        refresh_featured_pool()
+        entry = FeaturedProduct.objects.get(product=self.books[3])
+        entry.is_pinned = True
+        entry.save()
+
+        picks = pick_featured_ids()
+        self.assertEqual(picks[0], self.books[3].id)
+        self.assertEqual(len(picks), 6)
+        self.assertEqual(len(set(picks)), 6)
+
+    def test_zero_weight_entries_are_never_waited_for(self):
+        # Nothing for the automatic sample, only the manual entries below
+        Product.categories.through.objects.all().delete()
+        FeaturedProduct.objects.create(product=self.books[0], weight=1)
+        FeaturedProduct.objects.create(product=self.books[1], weight=0)
+        FeaturedProduct.objects.create(product=self.books[2], weight=0)
+        self.assertEqual(pick_featured_ids(), [self.books[0].id])
+
+        FeaturedProduct.objects.filter(product=self.books[0]).update(weight=0, is_pinned=True)
+        get_cache().clear()
+        self.assertEqual(pick_featured_ids(), [self.books[0].id])
+
+    def test_pool_follows_new_and_unpublished_books(self):
+        pick_featured_ids()
+        draft = self.books[0]
+        draft.status = "Draft"
+        draft.save()
+        new_book = self.create_book(10)
+
+        pool = get_featured_pool()
+        self.assertNotIn(draft.id, pool["ids"])
+        self.assertIn(new_book.id, pool["ids"])
+
+    def test_picks_bisect_the_cumulative_weights(self):
+        for index, weight in enumerate((1, 3, 6)):
+            FeaturedProduct.objects.create(product=self.books[index], weight=weight)
+        Product.categories.through.objects.all().delete()
+        self.assertEqual(get_featured_pool()["cumulative_weights"], [6, 9, 10])
+
+        with mock.patch("catalog.featured.random.random", side_effect=[0.95, 0.95, 0.7, 0.1]):
+            self.assertEqual(pick_featured_ids(count=3), [self.books[0].id, self.books[1].id, self.books[2].id])
+
+    def test_featured_endpoint_hydrates_in_constant_queries(self):
+        refresh_featured_pool()
+        self.signed_get("/api/catalog/featured/")
+        # Misses the cached response without resampling the pool
+        bump_version(FeaturedProduct)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.signed_get("/api/catalog/featured/")
+        self.assertEqual(len(response.json()), 6)
+        product_queries = [q for q in ctx.captured_queries if re.search(r'FROM .catalog_product.\s', q["sql"])]
+        self.assertEqual(len(product_queries), 1)
+
+
+class RelatedBooksIndexTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_author = Author.objects.create(name="Buchi Emecheta")
+        cls.tag = Tag.objects.create(name="Classic")
+        cls.book = cls.create_book(1)
+        cls.same_author = cls.create_book(2)
+        cls.same_tag = cls.create_book(3)
+        cls.unrelated = cls.create_book(4)
+        for book in (cls.book, cls.same_author, cls.same_tag, cls.unrelated):
+            book.categories.clear()
+        for book in (cls.same_tag, cls.unrelated):
+            book.authors.set([cls.other_author])
+        cls.book.tags.add(cls.tag)
+        cls.same_tag.tags.add(cls.tag)
+
+    def test_neighbours_are_ranked_by_shared_relations(self):
+        rebuild_related_index([self.book.id])
+        self.assertEqual(get_related_ids(Product.objects.get(id=self.book.id)), [self.same_author.id, self.same_tag.id])
+
+    def test_co_purchases_are_read_in_order_batches(self):
+        Order = apps.get_model("store", "Order")
+        OrderItem = apps.get_model("store", "OrderItem")
+        user = self.create_user(1)
+        products = Product.objects.in_bulk([self.book.id, self.same_tag.id, self.unrelated.id])
+        book, same_tag, unrelated = (products[self.book.id], products[self.same_tag.id], products[self.unrelated.id])
+        # Four baskets with `unrelated` outrank the shared author only if every batch is counted
+        for neighbour in (unrelated, unrelated, unrelated, unrelated, same_tag):
+            order = Order.objects.create(user=user, status="Pending")
+            OrderItem.objects.create(order=order, product=book, quantity=1)
+            OrderItem.objects.create(order=order, product=neighbour, quantity=1)
+
+        with mock.patch("catalog.related.ORDER_BATCH_SIZE", 1):
+            rebuild_related_index([self.book.id])
+        self.assertEqual(
+            get_related_ids(Product.objects.get(id=self.book.id)),
+            [self.unrelated.id, self.same_author.id, self.same_tag.id],
+        )
+
+    def test_deleted_neighbours_are_topped_up(self):
+        FeaturedProduct.objects.create(product=self.unrelated, weight=1)
+        rebuild_related_index([self.book.id])
+        self.same_author.delete()
+        get_cache().clear()
+        related = [book["id"] for book in self.signed_get(f"/api/catalog/books/{self.book.slug}/").json()["related_books"]]
+        self.assertEqual(related, [self.same_tag.id, self.unrelated.id])
+
+    def test_rebuild_command_covers_every_book_in_chunks(self):
+        ProductRelatedIndex.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_related_books", chunk_size=3, stdout=out)
+        self.assertEqual(ProductRelatedIndex.objects.count(), Product.objects.count())
+        self.assertEqual(
+            ProductRelatedIndex.objects.get(product=self.unrelated).related_ids,
+            [self.same_tag.id],
+        )
+
+    def test_detail_reads_the_index_in_constant_queries(self):
+        rebuild_related_index(Product.objects.values_list("id", flat=True))
+        self.signed_get(f"/api/catalog/books/{self.book.slug}/")
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.signed_get(f"/api/catalog/books/{self.book.slug}/")
+        related = [book["id"] for book in response.json()["related_books"]]
+        self.assertEqual(related[:2], [self.same_author.id, self.same_tag.id])
+        index_queries = [q for q in ctx.captured_queries if re.search(r"FROM .catalog_productrelatedindex.", q["sql"])]
+        self.assertEqual(index_queries, [])
+        through_queries = [q for q in ctx.captured_queries if "catalog_product_tags" in q["sql"]]
+        self.assertLessEqual(len(through_queries), 2)
+
+
+class BookReviewsTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.book = cls.create_book(1)
+        cls.ratings = [
+            ProductRating.objects.create(
+                user=cls.create_user(i), product=cls.book, score=i % 5 + 1, review=f"Review {i}"
+            )
+            for i in range(12)
+        ]
+        cls.reviews_url = f"/api/catalog/books/{cls.book.slug}/reviews/"
+
+    def test_detail_embeds_only_the_newest_reviews(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.signed_get(f"/api/catalog/books/{self.book.slug}/")
+        reviews = response.json()["reviews"]
+        self.assertEqual(len(reviews), settings.BOOK_DETAIL_REVIEWS_LIMIT)
+        first_page = self.signed_get(self.reviews_url, {"page_size": settings.BOOK_DETAIL_REVIEWS_LIMIT}).json()
+        self.assertEqual([review["id"] for review in reviews], [review["id"] for review in first_page["results"]])
+        user_queries = [q for q in ctx.captured_queries if re.search(r'FROM .auth_user.\s', q["sql"])]
+        self.assertEqual(user_queries, [])
+
+    def test_embedded_reviews_break_ties_like_the_cursor(self):
+        ProductRating.objects.filter(product=self.book).update(created_at=timezone.now())
+        reviews = self.signed_get(f"/api/catalog/books/{self.book.slug}/").json()["reviews"]
+        expected = [rating.id for rating in self.ratings[:settings.BOOK_DETAIL_REVIEWS_LIMIT]]
+        self.assertEqual([review["id"] for review in reviews], expected)
+
+    def test_renamed_reviewers_invalidate_cached_reviews(self):
+        reviewer = self.ratings[-1].user
+        self.signed_get(self.reviews_url)
+        self.signed_get(f"/api/catalog/books/{self.book.slug}/")
+        reviewer.first_name = "Chimamanda"
+        reviewer.save()
+
+        names = [review["user_first_name"] for review in self.signed_get(self.reviews_url).json()["results"]]
+        self.assertIn("Chimamanda", names)
+        embedded = self.signed_get(f"/api/catalog/books/{self.book.slug}/").json()["reviews"]
+        self.assertIn("Chimamanda", [review["user_first_name"] for review in embedded])
+
+    def test_logins_keep_cached_reviews(self):
+        with mock.patch("catalog.signals.bump_version_on_commit") as bump:
+            self.assertTrue(self.client.login(username="reader0", password="secret-pass"))
+        self.assertFalse(bump.called)
+
+    def test_reviews_follow_the_cursor_to_the_end(self):
+        seen = []
+        response = self.signed_get(self.reviews_url, {"page_size": 5})
+        while True:
+            data = response.json()
+            seen.extend(review["id"] for review in data["results"])
+            if not data["next"]:
+                break
+            next_url = urlparse(data["next"])
+            response = self.signed_get(next_url.path, parse_qs(next_url.query))
+        expected = ProductRating.objects.filter(product=self.book).order_by("-created_at", "id")
+        self.assertEqual(seen, list(expected.values_list("id", flat=True)))
+
+    def test_score_filter_and_ordering(self):
+        response = self.signed_get(self.reviews_url, {"score": "4,5", "order_by": "-score"})
+        scores = [review["score"] for review in response.json()["results"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(set(scores), {4, 5})
+        self.assertEqual(len(scores), 4)
+
+    def test_unknown_book_returns_404(self):
+        self.assertEqual(self.signed_get("/api/catalog/books/missing/reviews/").status_code, 404)
+
+
+class CategoryTreeTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.novels = Category.objects.create(name="Novels", parent=cls.category)
+        cls.poetry = Category.objects.create(name="Poetry", parent=cls.category)
+        cls.empty = Category.objects.create(name="Cookbooks")
+        cls.create_book(1)
+        cls.create_book(2).categories.add(cls.novels)
+        cls.create_book(3).categories.set([cls.novels])
+
+    def test_tree_nests_categories_with_rolled_up_counts(self):
+        tree = self.signed_get("/api/catalog/categories/tree/").json()
+        self.assertEqual([node["slug"] for node in tree], ["fiction"])
+        fiction = tree[0]
+        self.assertEqual((fiction["product_count"], fiction["total_product_count"]), (2, 3))
+        self.assertEqual([child["slug"] for child in fiction["children"]], ["novels"])
+        self.assertEqual(fiction["children"][0]["total_product_count"], 2)
+
+        tree = self.signed_get("/api/catalog/categories/tree/", {"include_empty": "true"}).json()
+        self.assertEqual({node["slug"] for node in tree}, {"fiction", "cookbooks"})
+
+    def test_cached_tree_skips_the_database_until_membership_changes(self):
+        url = "/api/catalog/categories/tree/"
+        self.signed_get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.signed_get(url)
+        self.assertFalse([q for q in ctx.captured_queries if "catalog_" in q["sql"]])
+
+        book = Product.objects.get(title="Book 1")
+        book.title = "Renamed"
+        book.save()
+        with CaptureQueriesContext(connection) as ctx:
+            self.signed_get(url)
+        self.assertFalse([q for q in ctx.captured_queries if "catalog_" in q["sql"]])
+
+        book.categories.add(self.poetry)
+        poetry = self.signed_get(url).json()[0]["children"][1]
+        self.assertEqual((poetry["slug"], poetry["total_product_count"]), ("poetry", 1))
+
+
+class SparseFieldsetTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.books = [cls.create_book(i) for i in range(3)]
+
+    def test_fields_limits_the_payload_and_the_queries(self):
+        with CaptureQueriesContext(connection) as full:
+            self.signed_get("/api/catalog/books/")
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.signed_get("/api/catalog/books/", {"fields": "title,slug,price,main_image"})
+
+        book = response.json()["results"][0]
+        self.assertEqual(set(book), {"title", "slug", "price", "main_image"})
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        for table in ("catalog_author", "catalog_category", "catalog_publisher", "catalog_productratingsummary"):
+            self.assertNotIn(table, sql)
+        self.assertLess(len(ctx.captured_queries), len(full.captured_queries))
+
+    def test_exclude_drops_fields_but_keeps_nested_shapes(self):
+        response = self.signed_get("/api/catalog/books/", {"exclude": "rating_counts,publisher"})
+        book = response.json()["results"][0]
+        self.assertNotIn("rating_counts", book)
+        self.assertNotIn("publisher", book)
+        self.assertIn("average_rating", book)
+        self.assertEqual(book["authors"][0]["name"], "Chinua Achebe")
+        self.assertIn("biography", book["authors"][0])
+
+    def test_detail_fieldset_skips_related_books(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.signed_get(f"/api/catalog/books/{self.books[0].slug}/", {"fields": "id,title"})
+        self.assertEqual(response.json(), {"id": self.books[0].id, "title": "Book 0"})
+        self.assertFalse([q for q in ctx.captured_queries if "catalog_productrelatedindex" in q["sql"]])
+
+    def test_detail_fieldset_does_not_trim_embedded_reviews(self):
+        ProductRating.objects.create(user=self.create_user(1), product=self.books[0], score=4)
+        path = f"/api/catalog/books/{self.books[0].slug}/"
+        review = self.signed_get(path, {"fields": "title,reviews"}).json()["reviews"][0]
+        self.assertEqual(review["score"], 4)
+        self.assertIn("id", self.signed_get(path, {"exclude": "id"}).json()["reviews"][0])
+
+
+class RendererNegotiationTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_book(1)
+
+    def test_json_is_the_default_and_varies_on_accept(self):
+        response = self.signed_get("/api/catalog/books/")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertIn("Accept", response["Vary"])
+
+    def test_line_separators_are_escaped_like_the_stock_renderer(self):
+        data = {"review": "one\u2028two\u2029three", "price": Decimal("9.99")}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    @skipUnless(msgpack is None, "msgpack is installed")
+    def test_msgpack_is_not_offered_without_the_package(self):
+        response = self.signed_get("/api/catalog/books/", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, 406)
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_is_negotiated_with_its_own_etag(self):
+        json_response = self.signed_get("/api/catalog/books/")
+        response = self.signed_get("/api/catalog/books/", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content)["count"], 1)
+        self.assertNotEqual(response["ETag"], json_response["ETag"])
+
+
+@tag("benchmark")
+@run_benchmarks
+class RendererBenchmark(CatalogAPITestCase):
+    """ Serialization throughput of the renderers on a 100-book page. """
+    iterations = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(100):
+            cls.create_book(index)
+
+    def measure(self, renderer, data):
+        start = time.perf_counter()
+        for _ in range(self.iterations):
+            renderer.render(data)
+        return self.iterations / (time.perf_counter() - start)
+
+    def test_fast_renderers_outpace_the_stock_json_renderer(self):
+        data = self.signed_get("/api/catalog/books/", {"page_size": 100}).data
+        self.assertEqual(len(data["results"]), 100)
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+        renderers = [("json", JSONRenderer()), ("fast json", FastJSONRenderer())]
+        if msgpack:
+            renderers.append(("msgpack", MessagePackRenderer()))
+        results = {name: self.measure(renderer, data) for name, renderer in renderers}
+        for name, rate in results.items():
+            if name != "json":
+                self.assertGreater(rate, results["json"], name)
+
+
+class ImportCatalogTest(CatalogAPITestCase):
+
+    def write_feed(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, "w") as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def import_feed(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command("import_catalog", path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_feed_upserts_books_and_names(self):
+        path = self.write_feed(".csv", (
+            "isbn,title,price,pages,stock_quantity,format_type,publisher,authors,categories,tags\n"
+            "978-0000000001,Arrow of God,12.50,230,3,physical,Heinemann,Chinua Achebe|Wole Soyinka,Fiction|Classics,africa\n"
+            "9780000000002,Arrow of God,9.00,120,0,both,Heinemann,Wole Soyinka,Classics,\n"
+            "9780000000002,Arrow of God,9.99,120,0,both,Heinemann,Wole Soyinka,Classics,\n"
+            "9780000000003,,9.00,120,0,physical,,,,\n"
+        ))
+        out, err = self.import_feed(path)
+
+        self.assertIn("2 created, 0 updated, 1 duplicate ISBNs, 1 skipped", out)
+        self.assertIn("line 5: missing title", err)
+
+        first = Product.objects.get(isbn="9780000000001")
+        second = Product.objects.get(isbn="9780000000002")
+        self.assertEqual({first.slug, second.slug}, {"arrow-of-god", "arrow-of-god-2"})
+        self.assertEqual(str(second.price), "9.99")
+        self.assertEqual(first.physical_stock_status, "low_stock")
+        self.assertEqual(second.ebook_stock_status, "available")
+        self.assertEqual(Author.objects.filter(name="Chinua Achebe").count(), 1)
+        self.assertEqual(set(first.authors.values_list("name", flat=True)), {"Chinua Achebe", "Wole Soyinka"})
+        self.assertEqual(set(first.categories.values_list("slug", flat=True)), {"fiction", "classics"})
+        self.assertEqual(second.publisher, first.publisher)
+        self.assertTrue(ProductRatingSummary.objects.filter(product=first).exists())
+        self.assertIn("soyinka", ProductSearchDocument.objects.get(product=first).document)
+        # New categories are valid MPTT nodes
+        classics = Category.objects.get(slug="classics")
+        self.assertEqual((classics.lft, classics.rght, classics.level), (1, 2, 0))
+        self.assertNotEqual(classics.tree_id, Category.objects.get(slug="fiction").tree_id)
+
+    def test_jsonl_feed_updates_existing_books(self):
+        book = self.create_book(1)
+        feed = [
+            {"isbn": book.isbn, "title": "Renamed", "price": "15.00", "pages": 90, "stock_quantity": 50, "tags": ["new"]},
+            {"isbn": "9780000009999", "title": "Fresh", "price": "5", "pages": 10},
+        ]
+        path = self.write_feed(".jsonl", "\n".join(json.dumps(row) for row in feed) + "\nnot json\n")
+        out, err = self.import_feed(path)
+
+        self.assertIn("1 created, 1 updated", out)
+        self.assertIn("unreadable row", err)
+        book.refresh_from_db()
+        self.assertEqual((book.title, book.slug, book.stock_quantity), ("Renamed", "book-1", 50))
+        self.assertEqual(list(book.tags.values_list("name", flat=True)), ["new"])
+        # Relations the feed leaves out are kept
+        self.assertEqual(list(book.authors.all()), [self.author])
+
+    def test_batch_cost_does_not_grow_with_its_size(self):
+        def feed(start, count):
+            rows = [
+                {"isbn": f"97810000{index:05d}", "title": f"Title {index}", "price": "5", "pages": 10,
+                 "authors": ["Chinua Achebe"], "categories": ["Fiction"]}
+                for index in range(start, start + count)
+            ]
+            return self.write_feed(".jsonl", "\n".join(json.dumps(row) for row in rows))
+
+        with CaptureQueriesContext(connection) as small:
+            self.import_feed(feed(0, 5))
+        with CaptureQueriesContext(connection) as large:
+            # Kept under SQLite's bound-parameter limit, which splits larger inserts
+            self.import_feed(feed(100, 40))
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+
+@override_settings(CATALOG_EXPORT_CHUNK_SIZE=2)
+class CatalogExportTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.books = [cls.create_book(i) for i in range(5)]
+        cls.create_book(9, status="Draft")
+
+    def read(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_jsonl_streams_every_published_book_in_chunks(self):
+        response = self.signed_get("/api/catalog/export/jsonl/")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        with CaptureQueriesContext(connection) as ctx:
+            rows = [json.loads(line) for line in self.read(response).splitlines()]
+
+        self.assertEqual([row["isbn"] for row in rows], [book.isbn for book in self.books])
+        self.assertEqual(rows[0]["authors"], ["Chinua Achebe"])
+        # Three chunks, each one product query plus the three prefetches
+        self.assertEqual(len(ctx.captured_queries), 3 * 4)
+
+    def test_updated_since_returns_recent_books_only(self):
+        recent = timezone.now() + timedelta(days=1)
+        Product.objects.filter(id=self.books[1].id).update(updated_at=recent)
+        response = self.signed_get("/api/catalog/export/jsonl/", {"updated_since": recent.date().isoformat()})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row["isbn"] for row in rows], [self.books[1].isbn])
+
+        self.assertEqual(self.signed_get("/api/catalog/export/jsonl/", {"updated_since": "soon"}).status_code, 400)
+
+    def test_csv_uses_the_import_columns(self):
+        content = self.read(self.signed_get("/api/catalog/export/csv/")).splitlines()
+        self.assertTrue(content[0].startswith("isbn,title,slug"))
+        self.assertEqual(len(content), 6)
+        self.assertEqual(self.signed_get("/api/catalog/export/xml/").status_code, 404)
+
+
+class StockStatusReconciliationTest(CatalogAPITestCase):
+
+    def test_statuses_follow_quantity_and_publication_date(self):
+        launch = timezone.localdate() + timedelta(days=3)
+        ebook = self.create_book(1, format_type="ebook", publication_date=launch)
+        physical = self.create_book(2, stock_quantity=10)
+        self.assertEqual(ebook.ebook_stock_status, "pre_order")
+
+        # Launch day passes and stock sells through queryset updates, which skip save()
+        Product.objects.filter(id=ebook.id).update(publication_date=timezone.localdate())
+        Product.objects.filter(id=physical.id).update(stock_quantity=2)
+        with CaptureQueriesContext(connection) as ctx:
+            changed = reconcile_stock_status()
+
+        self.assertEqual(changed["ebook_stock_status:available"], 1)
+        self.assertEqual(changed["physical_stock_status:low_stock"], 1)
+        self.assertEqual(sum(changed.values()), 2)
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 5)
+        ebook.refresh_from_db()
+        physical.refresh_from_db()
+        self.assertEqual((ebook.ebook_stock_status, physical.physical_stock_status), ("available", "low_stock"))
+
+        self.assertEqual(sum(reconcile_stock_status().values()), 0)
+
+    def test_command_reports_changes(self):
+        book = self.create_book(1)
+        Product.objects.filter(id=book.id).update(stock_quantity=0)
+        out = StringIO()
+        call_command("reconcile_stock_status", stdout=out)
+        self.assertIn("physical_stock_status:out_of_stock: 1", out.getvalue())
+
+    def test_publication_date_defaults_to_today(self):
+        book = Product.objects.create(title="Today", isbn="9780000000777", price="5", pages=10, format_type="ebook")
+        self.assertEqual(book.publication_date, timezone.localdate())
+        self.assertEqual(book.ebook_stock_status, "available")
+
+
+class ImageDerivativeTest(CatalogAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, book, mode="RGB", size=(1200, 1800)):
+        buffer = BytesIO()
+        Image.new(mode, size, "red").save(buffer, "PNG")
+        return ProductImage.objects.create(
+            book=book, image=SimpleUploadedFile("cover.png", buffer.getvalue(), content_type="image/png")
+        )
+
+    def derivatives(self, name):
+        return [derivative_name(name, size, image_format) for size in IMAGE_SIZES for image_format in IMAGE_FORMATS]
+
+    def test_upload_writes_every_size_and_format(self):
+        image = self.upload(self.create_book(1), mode="RGBA")
+        names = self.derivatives(image.image.name)
+        self.assertTrue(all(default_storage.exists(name) for name in names))
+        with default_storage.open(derivative_name(image.image.name, "card", "webp")) as card:
+            self.assertEqual(Image.open(card).size, (300, 450))
+
+        response = self.signed_get("/api/catalog/books/")
+        srcset = response.json()["results"][0]["main_image_srcset"]
+        self.assertIn("/card.webp 300w", srcset["webp"])
+        self.assertTrue(srcset["jpg"].startswith("http://"))
+
+    def test_srcset_lists_only_generated_derivatives(self):
+        image = self.upload(self.create_book(1))
+        for name in self.derivatives(image.image.name):
+            if name.endswith(".webp") or "/detail." in name:
+                default_storage.delete(name)
+        get_cache().clear()
+
+        srcset = self.signed_get("/api/catalog/books/").json()["results"][0]["main_image_srcset"]
+        self.assertEqual(set(srcset), {"jpg"})
+        self.assertIn("/card.jpg 300w", srcset["jpg"])
+        self.assertNotIn("/detail.jpg", srcset["jpg"])
+
+        for name in self.derivatives(image.image.name):
+            if name.endswith(".jpg"):
+                default_storage.delete(name)
+        get_cache().clear()
+        self.assertIsNone(self.signed_get("/api/catalog/books/").json()["results"][0]["main_image_srcset"])
+
+    def test_decompression_bombs_are_served_as_originals(self):
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000), self.assertLogs("catalog.images", "WARNING"):
+            image = self.upload(self.create_book(1))
+        self.assertFalse(any(default_storage.exists(name) for name in self.derivatives(image.image.name)))
+        self.assertIsNone(self.signed_get("/api/catalog/books/").json()["results"][0]["main_image_srcset"])
+
+    def test_derivatives_are_only_rebuilt_when_the_source_changes(self):
+        image = self.upload(self.create_book(1))
+        card = derivative_name(image.image.name, "card", "jpg")
+        written_at = default_storage.get_modified_time(card)
+
+        image.save()
+        self.assertEqual(default_storage.get_modified_time(card), written_at)
+
+        source = default_storage.path(image.image.name)
+        later = os.path.getmtime(default_storage.path(card)) + 10
+        os.utime(source, (later, later))
+        image.save()
+        self.assertGreater(default_storage.get_modified_time(card), written_at)
+
+    def test_backfill_command_regenerates_missing_derivatives_in_a_pool(self):
+        images = [self.upload(self.create_book(i)) for i in range(3)]
+        for image in images:
+            for name in self.derivatives(image.image.name):
+                default_storage.delete(name)
+
+        out = StringIO()
+        call_command("generate_image_derivatives", workers=2, stdout=out)
+        self.assertIn("Checked 3 images, wrote 18 derivatives.", out.getvalue())
+        self.assertTrue(all(default_storage.exists(name) for name in self.derivatives(images[0].image.name)))
+
+        out = StringIO()
+        call_command("generate_image_derivatives", workers=1, stdout=out)
+        self.assertIn("wrote 0 derivatives", out.getvalue())
+
+
+class DiscountIndexTest(CatalogAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.book = cls.create_book(1)
+        cls.other = cls.create_book(2)
+        cls.now = timezone.now()
+
+    def setUp(self):
+        super().setUp()
+        clear_discount_index()
+
+    def add_discount(self, book, min_quantity, percentage, start=-1, end=1):
+        return Discount.objects.create(
+            product=book, min_quantity=min_quantity, discount_percentage=Decimal(percentage),
+            start_date=self.now + timedelta(days=start), end_date=self.now + timedelta(days=end),
+        )
+
+    def expected(self, product, quantity, now):
+        # The per-line query the index replaces
+        return product.bulk_discounts.filter(
+            start_date__lte=now, end_date__gte=now, min_quantity__lte=quantity
+        ).first()
+
+    def test_resolution_matches_the_per_line_queries(self):
+        self.add_discount(self.book, 3, "10")
+        self.add_discount(self.book, 1, "5")
+        self.add_discount(self.book, 1, "50", start=2, end=5)
+        self.add_discount(self.other, 2, "20", start=-5, end=-2)
+
+        for now in (self.now, self.now + timedelta(days=3), self.now - timedelta(days=3)):
+            lines = [(product.id, quantity) for product in (self.book, self.other) for quantity in (1, 2, 3, 5)]
+            expected = [
+                self.expected(product, quantity, now)
+                for product in (self.book, self.other) for quantity in (1, 2, 3, 5)
+            ]
+            self.assertEqual(resolve_discounts(lines, now=now), expected)
+
+    def test_basket_resolution_is_served_from_memory(self):
+        discount = self.add_discount(self.book, 1, "10")
+        resolve_discounts([(self.book.id, 1)])
+        with CaptureQueriesContext(connection) as ctx:
+            resolved = resolve_discounts([(self.book.id, 1), (self.other.id, 4)] * 10)
+        # Only the table signature is read
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(resolved[:2], [discount, None])
+
+    def test_writes_without_signals_invalidate_the_index(self):
+        # Another process's writes send no signal here, the table signature still changes
+        self.assertEqual(resolve_discounts([(self.book.id, 1)]), [None])
+        Discount.objects.bulk_create([Discount(
+            product=self.book, min_quantity=1, discount_percentage=Decimal("10"),
+            start_date=self.now - timedelta(days=1), end_date=self.now + timedelta(days=1),
+        )])
+        discount = Discount.objects.get()
+        self.assertEqual(resolve_discounts([(self.book.id, 1)]), [discount])
+
+        Discount.objects.filter(pk=discount.pk).delete()
+        self.assertEqual(resolve_discounts([(self.book.id, 1)]), [None])
+
+    def test_saves_and_ended_discounts_invalidate_the_index(self):
+        discount = self.add_discount(self.book, 1, "10", end=0)
+        self.assertEqual(resolve_discounts([(self.book.id, 1)], now=self.now - timedelta(hours=1)), [discount])
+
+        discount.min_quantity = 5
+        discount.save()
+        self.assertEqual(resolve_discounts([(self.book.id, 1)], now=self.now - timedelta(hours=1)), [None])
+        self.assertEqual(resolve_discounts([(self.book.id, 5)], now=self.now + timedelta(seconds=1)), [None])
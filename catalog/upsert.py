@@ -0,0 +1,20 @@
+# upsert.py for catalog app
+from django.db import connection
+
+
+def bulk_upsert(model, objs, unique_fields, update_fields):
+    """
+    Insert `objs`, updating `update_fields` of the rows that already exist
+    for their `unique_fields`. MySQL's ON DUPLICATE KEY UPDATE cannot name a
+    conflict target (Django raises NotSupportedError when one is given), so
+    the target is only passed to backends that support it; on MySQL the
+    unique key over `unique_fields` is what triggers the update.
+    """
+    if not connection.features.supports_update_conflicts_with_target:
+        unique_fields = None
+    model.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=update_fields,
+    )
@@ -2,25 +2,33 @@ from django.urls import path
 from .views import (
     AuthorListView,
     CategoryListView,
+    CategoryTreeView,
     PublisherListView,
     TagListView,
     BookListView,
+    BookFacetsView,
     BookDetailView,
+    BookReviewListView,
     BookImageListView,
     RatingCountsView,
     SubmitProductRatingView,
-    FeaturedBooksView
+    FeaturedBooksView,
+    CatalogExportView
 )
 
 urlpatterns = [
     path("api/catalog/authors/", AuthorListView.as_view(), name="author-list"),
     path("api/catalog/categories/", CategoryListView.as_view(), name="category-list"),
+    path("api/catalog/categories/tree/", CategoryTreeView.as_view(), name="category-tree"),
     path("api/catalog/publishers/", PublisherListView.as_view(), name="publisher-list"),
     path("api/catalog/tags/", TagListView.as_view(), name="tag-list"),
     path("api/catalog/books/", BookListView.as_view(), name="book-list"),
+    path("api/catalog/books/facets/", BookFacetsView.as_view(), name="book-facets"),
     path("api/catalog/books/<slug:slug>/", BookDetailView.as_view(), name="book-detail"),
+    path("api/catalog/books/<slug:slug>/reviews/", BookReviewListView.as_view(), name="book-reviews"),
     path("api/catalog/book-images/", BookImageListView.as_view(), name="book-image-list"),
     path("api/catalog/rating-counts/", RatingCountsView.as_view(), name="rating-counts"),
     path("api/catalog/<slug:slug>/reviews/", SubmitProductRatingView.as_view(), name="submit-product-reviews"),
     path("api/catalog/featured/", FeaturedBooksView.as_view(), name="featured-books"),
+    path("api/catalog/export/<str:export_format>/", CatalogExportView.as_view(), name="catalog-export"),
 ]
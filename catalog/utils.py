@@ -1 +1,148 @@
 # utils.py for catalog app
+from django.db.models import Prefetch, Exists, OuterRef, Subquery, Func, Count, IntegerField, Value
+from django.db.models.functions import Coalesce
+from .models import Category, Product, ProductImage, ProductRatingSummary
+
+RATING_SCORES = range(1, 6)
+
+
+def empty_rating_stats():
+    return {
+        "average": 0,
+        "count": 0,
+        "counts": {score: 0 for score in RATING_SCORES},
+    }
+
+
+def summary_rating_stats(summary):
+    return {
+        "average": summary.average_rating,
+        "count": summary.rating_count,
+        "counts": summary.score_counts,
+    }
+
+
+def attach_rating_stats(products):
+    """
+    Read the precomputed rating summaries for a page of products with a
+    single lookup and store them on each product as `rating_stats`.
+    """
+    products = list(products)
+    by_id = {product.id: product for product in products}
+    for product in products:
+        product.rating_stats = empty_rating_stats()
+
+    if not by_id:
+        return products
+
+    for summary in ProductRatingSummary.objects.filter(product_id__in=by_id.keys()):
+        by_id[summary.product_id].rating_stats = summary_rating_stats(summary)
+
+    return products
+
+
+def get_rating_stats(product):
+    """Return the rating stats attached to a product, computing them if missing."""
+    if not hasattr(product, "rating_stats"):
+        attach_rating_stats([product])
+    return product.rating_stats
+
+
+def book_card_queryset(queryset=None, fields=None):
+    """
+    Queryset for book cards (list, featured, related). Relations are
+    loaded in bulk and the main image is read from `Product.main_image`,
+    so a page costs the same number of queries whatever its size. When
+    `fields` is given, relations missing from it are not loaded at all.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    if fields is None or "publisher" in fields:
+        queryset = queryset.select_related("publisher")
+    prefetches = [name for name in ("categories", "authors") if fields is None or name in fields]
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+def product_images_prefetch(lookup="images"):
+    """Prefetch every image of a product, main image first, into `prefetched_images`."""
+    return Prefetch(
+        lookup,
+        queryset=ProductImage.objects.order_by("-is_main", "id"),
+        to_attr="prefetched_images",
+    )
+
+
+class CountDistinct(Func):
+    function = "COUNT"
+    template = "%(function)s(DISTINCT %(expressions)s)"
+    output_field = IntegerField()
+
+
+def filter_by_category_subtrees(queryset, slugs):
+    """
+    Keep products in any of the given categories or their descendants.
+    Descendants are matched with the MPTT (tree_id, lft, rght) range in
+    SQL, so the tree is never expanded in Python.
+    """
+    selected = Category.objects.filter(
+        slug__in=slugs,
+        tree_id=OuterRef("category__tree_id"),
+        lft__lte=OuterRef("category__lft"),
+        rght__gte=OuterRef("category__rght"),
+    )
+    memberships = (
+        Product.categories.through.objects
+        .filter(Exists(selected))
+        .values("product_id")
+    )
+    return queryset.filter(id__in=memberships)
+
+
+def build_category_tree(include_empty=False):
+    """
+    Load every category with its direct and subtree product counts in one
+    query, then nest them by walking the (tree_id, lft) order with a stack.
+    Subtree counts use the MPTT range, so a book filed under several
+    descendants is counted once.
+    """
+    memberships = Product.categories.through.objects.order_by()
+    direct_count = (
+        memberships
+        .filter(category_id=OuterRef("pk"))
+        .values("category_id")
+        .annotate(total=Count("product_id"))
+        .values("total")
+    )
+    subtree_count = (
+        memberships
+        .filter(
+            category__tree_id=OuterRef("tree_id"),
+            category__lft__gte=OuterRef("lft"),
+            category__rght__lte=OuterRef("rght"),
+        )
+        .annotate(total=CountDistinct("product_id"))
+        .values("total")
+    )
+    categories = (
+        Category.objects
+        .annotate(
+            product_count=Coalesce(Subquery(direct_count, output_field=IntegerField()), Value(0)),
+            total_product_count=Coalesce(Subquery(subtree_count, output_field=IntegerField()), Value(0)),
+        )
+        .order_by("tree_id", "lft")
+    )
+
+    roots = []
+    stack = []
+    for category in categories:
+        category.tree_children = []
+        while stack and (stack[-1].tree_id != category.tree_id or stack[-1].rght < category.lft):
+            stack.pop()
+        if not include_empty and category.total_product_count == 0:
+            # Every descendant of an empty node is empty too, so the subtree is skipped
+            continue
+        (stack[-1].tree_children if stack else roots).append(category)
+        stack.append(category)
+    return roots
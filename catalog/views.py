@@ -1,22 +1,39 @@
 from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Author, Category, Publisher, Tag, Product, ProductImage, ProductRating
+from .models import Author, Category, Publisher, Tag, Product, ProductImage, ProductRating, FeaturedProduct, ProductRelatedIndex
 from auth_core.views import PublicViewMixin, PrivateUserViewMixin
 from django.db.models import Q, Count, Avg, IntegerField
-from .pagination import BookPagination
-from django.http import JsonResponse
-import random
+from .pagination import BookPagination, BookCursorPagination, ReviewCursorPagination
+from .utils import book_card_queryset, build_category_tree
+from .filters import apply_book_filters, compute_book_facets, get_list_param
+from .featured import pick_featured_ids
+from .export import EXPORT_FORMATS, EXPORT_STREAMS, iter_export_products
+from .cache import CachedResponseMixin
+from .fieldsets import SparseFieldsetViewMixin, get_fieldset
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from datetime import datetime, time
+from django.shortcuts import get_object_or_404
+from django.contrib.auth.models import User
 from .serializers import (
     AuthorSerializer, CategorySerializer, PublisherSerializer, TagSerializer, 
-    BookListSerializer, BookDetailSerializer, BookImageSerializer, ProductRatingSerializer
+    BookListSerializer, BookDetailSerializer, BookImageSerializer, ProductRatingSerializer,
+    CategoryTreeSerializer
     )
 
-class AuthorListView(PublicViewMixin, generics.ListAPIView):
+# Models whose changes invalidate cached book payloads
+BOOK_CACHE_MODELS = (Product, Author, Category, Publisher, Tag, ProductImage, ProductRating)
+
+class AuthorListView(PublicViewMixin, SparseFieldsetViewMixin, CachedResponseMixin, generics.ListAPIView):
+    cache_models = (Author,)
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
 
-class CategoryListView(PublicViewMixin, generics.ListAPIView):
+class CategoryListView(PublicViewMixin, SparseFieldsetViewMixin, CachedResponseMixin, generics.ListAPIView):
+    cache_models = (Category, Product)
     serializer_class = CategorySerializer
 
     def get_queryset(self):
@@ -27,85 +44,53 @@ class CategoryListView(PublicViewMixin, generics.ListAPIView):
             .order_by("-product_count", "name")
         )
 
-class PublisherListView(PublicViewMixin, generics.ListAPIView):
+class CategoryTreeView(PublicViewMixin, CachedResponseMixin, APIView):
+    """ Nested categories with direct and subtree product counts. """
+    # Only category edits and category membership changes invalidate the tree
+    cache_models = (Category, Product.categories.through)
+    cache_timeout = 24 * 60 * 60
+
+    def get(self, request, *args, **kwargs):
+        return self.get_cached_response(request, lambda: self.get_tree(request))
+
+    def get_tree(self, request):
+        include_empty = request.query_params.get("include_empty") in ("1", "true")
+        serializer = CategoryTreeSerializer(
+            build_category_tree(include_empty=include_empty), many=True, context={"request": request}
+        )
+        return Response(serializer.data)
+
+class PublisherListView(PublicViewMixin, SparseFieldsetViewMixin, CachedResponseMixin, generics.ListAPIView):
+    cache_models = (Publisher,)
     queryset = Publisher.objects.all()
     serializer_class = PublisherSerializer
 
-class TagListView(PublicViewMixin, generics.ListAPIView):
+class TagListView(PublicViewMixin, SparseFieldsetViewMixin, CachedResponseMixin, generics.ListAPIView):
+    cache_models = (Tag,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
-class BookListView(PublicViewMixin, generics.ListAPIView):
+class BookListView(PublicViewMixin, SparseFieldsetViewMixin, CachedResponseMixin, generics.ListAPIView):
+    cache_models = BOOK_CACHE_MODELS
     serializer_class = BookListSerializer
     pagination_class = BookPagination
 
-    def get_queryset(self):
-        queryset = Product.objects.all()
-
-        # Filter by category if provided
-        category_slug = self.request.query_params.get("category")
-        if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
-        
-        # Filter by format type
-        format_type = self.request.query_params.get("format_type")
-        if format_type:
-            if format_type in ["ebook", "physical"]:
-                queryset = queryset.filter(Q(format_type=format_type) | Q(format_type="both"))
+    @property
+    def paginator(self):
+        # ?pagination=cursor switches to keyset pagination for infinite scroll and crawlers
+        if not hasattr(self, "_paginator"):
+            if self.request.query_params.get("pagination") == "cursor":
+                self._paginator = BookCursorPagination()
             else:
-                queryset = queryset.filter(format_type=format_type)
-            
-        # Filter by stock status (maps ebook + physical)
-        stock_status = self.request.query_params.get("stock_status")
-        if stock_status:
-            status_map = {
-                "in_stock": Q(physical_stock_status="in_stock") | Q(ebook_stock_status="available"),
-                "out_of_stock": Q(physical_stock_status="out_of_stock") & Q(ebook_stock_status="unavailable"),
-                "pre_order": Q(physical_stock_status="pre_order") | Q(ebook_stock_status="pre_order"),
-                "backorder": Q(physical_stock_status="backorder"),
-                "out_of_print": Q(physical_stock_status="out_of_print"),
-                "print_on_demand": Q(physical_stock_status="print_on_demand"),
-                "available": Q(ebook_stock_status="available"),
-                "unavailable": Q(ebook_stock_status="unavailable"),
-            }
-
-            if stock_status in status_map:
-                queryset = queryset.filter(status_map[stock_status])
-            else:
-                # Fallback: match directly in either field
-                queryset = queryset.filter(
-                    Q(physical_stock_status__iexact=stock_status) |
-                    Q(ebook_stock_status__iexact=stock_status)
-                )
-
-        # Filter by price range
-        price_min = self.request.query_params.get("price_min")
-        price_max = self.request.query_params.get("price_max")
-        if price_min:
-            queryset = queryset.filter(price__gte=price_min)
-        if price_max:
-            queryset = queryset.filter(price__lte=price_max)
-
-        # Filter by average rating (frontend sends 1–5, return < that OR no reviews)
-        rating_threshold = self.request.query_params.get("rating")
-        if rating_threshold:
-            try:
-                rating_threshold = int(rating_threshold)
-                queryset = queryset.annotate(avg_rating=Avg("ratings__score"))
-                queryset = queryset.filter(
-                    Q(avg_rating__lt=rating_threshold) | Q(avg_rating__isnull=True)
-                )
-            except ValueError:
-                pass
-        
-        # Filter by search query
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        # Relations left out by ?fields= / ?exclude= are not loaded
+        queryset = apply_book_filters(
+            book_card_queryset(fields=self.get_serialized_fields()), self.request.query_params
+        )
         search_query = self.request.query_params.get("search")
-        if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(authors__name__icontains=search_query) |
-                Q(categories__name__icontains=search_query)
-            ).distinct()
 
         # Handle ordering
         order_by_params = []
@@ -119,25 +104,77 @@ class BookListView(PublicViewMixin, generics.ListAPIView):
 
         order_by_params = [param.strip() for param in order_by_params if param.strip()]
 
-        valid_fields = ["title", "price", "created_at"]
+        # Public ordering names mapped to indexed model fields
+        valid_fields = {
+            "title": "title",
+            "price": "price",
+            "created_at": "created_at",
+            "average_rating": "avg_rating",
+            "popularity": "rating_count",
+        }
         cleaned_orders = []
         for field in order_by_params:
             clean_field = field.lstrip('-')
             if clean_field in valid_fields:
-                cleaned_orders.append(field)
+                direction = "-" if field.startswith("-") else ""
+                cleaned_orders.append(direction + valid_fields[clean_field])
 
         if cleaned_orders:
             queryset = queryset.order_by(*cleaned_orders)
+        elif search_query:
+            queryset = queryset.order_by("-search_rank", "-created_at")
         else:
             queryset = queryset.order_by("-created_at")
 
         return queryset
 
-class BookDetailView(PublicViewMixin, generics.RetrieveAPIView):
-    queryset = Product.objects.all()
+class BookFacetsView(PublicViewMixin, CachedResponseMixin, APIView):
+    cache_models = BOOK_CACHE_MODELS
+
+    def get(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, lambda: Response(compute_book_facets(request.query_params))
+        )
+
+class BookDetailView(PublicViewMixin, SparseFieldsetViewMixin, CachedResponseMixin, generics.RetrieveAPIView):
+    # User: embedded reviews show the reviewer's first name
+    cache_models = BOOK_CACHE_MODELS + (ProductRelatedIndex, User)
     serializer_class = BookDetailSerializer
     lookup_field = "slug"
 
+    def get_queryset(self):
+        queryset = Product.objects.all()
+        if "related_books" in self.get_serialized_fields():
+            queryset = queryset.select_related("related_index")
+        return queryset
+
+class BookReviewListView(PublicViewMixin, SparseFieldsetViewMixin, CachedResponseMixin, generics.ListAPIView):
+    """ A book's reviews with keyset pagination, sorting by recency or score and score filtering. """
+    cache_models = (Product, ProductRating, User)
+    serializer_class = ProductRatingSerializer
+    pagination_class = ReviewCursorPagination
+    valid_orderings = {
+        "created_at": "created_at",
+        "score": "score",
+    }
+
+    def get_queryset(self):
+        product = get_object_or_404(Product.objects.only("id"), slug=self.kwargs["slug"])
+        queryset = ProductRating.objects.filter(product=product).select_related("user")
+
+        scores = [
+            int(score) for score in get_list_param(self.request.query_params, "score")
+            if score.isdigit() and 1 <= int(score) <= 5
+        ]
+        if scores:
+            queryset = queryset.filter(score__in=scores)
+
+        order_by = self.request.query_params.get("order_by", "").strip()
+        field = self.valid_orderings.get(order_by.lstrip("-"))
+        if field:
+            return queryset.order_by(("-" if order_by.startswith("-") else "") + field)
+        return queryset.order_by("-created_at")
+
 class BookImageListView(PublicViewMixin, generics.ListAPIView):
     queryset = ProductImage.objects.all()
     serializer_class = BookImageSerializer
@@ -155,28 +192,59 @@ class SubmitProductRatingView(PrivateUserViewMixin, generics.CreateAPIView):
         product = Product.objects.get(slug=product_slug)
         serializer.save(user=self.request.user, product=product)
 
-class FeaturedBooksView(PublicViewMixin, APIView):
-    def get(self, request, *args, **kwargs):
-        # Step 1: Get IDs of top categories (safe for MariaDB)
-        top_category_ids = (
-            Category.objects
-            .annotate(product_count=Count("books"))
-            .order_by("-product_count")
-            .values_list("id", flat=True)[:5]
-        )
+class FeaturedBooksView(PublicViewMixin, CachedResponseMixin, APIView):
+    cache_models = BOOK_CACHE_MODELS + (FeaturedProduct,)
+    # Short timeout so the random selection still rotates
+    cache_timeout = 60
 
-        # Step 2: Fetch categories with those IDs
-        top_categories = Category.objects.filter(id__in=list(top_category_ids))
-
-        # Step 3: Gather products from those categories
-        products = Product.objects.filter(categories__in=top_categories).distinct()
-
-        # Step 4: Pick 6 random products (or fewer if not enough exist)
-        product_count = min(6, products.count())
-        selected_products = random.sample(list(products), product_count) if product_count else []
-
-        # Step 5: Serialize them with BookListSerializer
-        serializer = BookListSerializer(
-            selected_products, many=True, context={"request": request}
+    def get(self, request, *args, **kwargs):
+        return self.get_cached_response(request, lambda: self.get_featured(request))
+
+    def get_featured(self, request):
+        # Pick from the precomputed pool, then load the books in one prefetched query
+        context = {"request": request, **get_fieldset(request.query_params)}
+        featured_ids = pick_featured_ids()
+        fields = set(BookListSerializer(context=context).fields)
+        books = book_card_queryset(fields=fields).in_bulk(featured_ids)
+        selected_products = [books[product_id] for product_id in featured_ids if product_id in books]
+
+        serializer = BookListSerializer(selected_products, many=True, context=context)
+        return Response(serializer.data)
+
+class CatalogExportView(PublicViewMixin, APIView):
+    """
+    Stream the published catalog as JSONL or CSV for partners mirroring it.
+    ?updated_since= (ISO date or datetime) limits the export to books
+    updated since then, for incremental pulls.
+    """
+
+    def get(self, request, export_format, *args, **kwargs):
+        if export_format not in EXPORT_FORMATS:
+            raise NotFound("Unknown export format.")
+
+        products = iter_export_products(updated_since=self.get_updated_since(request))
+        response = StreamingHttpResponse(
+            EXPORT_STREAMS[export_format](products, request),
+            content_type=EXPORT_FORMATS[export_format],
         )
-        return Response(serializer.data)
\ No newline at end of file
+        response["Content-Disposition"] = f'attachment; filename="catalog.{export_format}"'
+        return response
+
+    def get_updated_since(self, request):
+        value = request.query_params.get("updated_since")
+        if not value:
+            return None
+
+        try:
+            updated_since = parse_datetime(value)
+            if updated_since is None:
+                day = parse_date(value)
+                updated_since = datetime.combine(day, time.min) if day else None
+        except ValueError:
+            updated_since = None
+        if updated_since is None:
+            raise ValidationError({"updated_since": "Use an ISO 8601 date or datetime."})
+
+        if timezone.is_naive(updated_since):
+            updated_since = timezone.make_aware(updated_since)
+        return updated_since
@@ -4,6 +4,7 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 from datetime import timedelta
+from importlib.util import find_spec
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -140,6 +141,12 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'auth_core.renderers.FastJSONRenderer',
+        # only advertised when msgpack is installed, selecting it would fail otherwise
+        *(['auth_core.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_THROTTLE_CLASSES': [
         # 'auth_core.throttling.APIKeyRateThrottle',
     ],
@@ -192,4 +199,21 @@ FLUTTERWAVE_PUBLIC_KEY = os.environ.get('FLUTTERWAVE_PUBLIC_KEY')
 FLUTTERWAVE_SECRET_KEY = os.environ.get('FLUTTERWAVE_SECRET_KEY')
 
 DJANGO_PG_SUCCESS_REDIRECT = ''
-DJANGO_PG_FAILURE_REDIRECT = ''
\ No newline at end of file
+DJANGO_PG_FAILURE_REDIRECT = ''
+
+# catalog response cache (prod.py configures redis so version bumps reach every worker)
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# featured books pool
+FEATURED_POOL_SIZE = 100
+FEATURED_POOL_TIMEOUT = 60 * 60
+
+# number of related book ids stored per product
+RELATED_BOOKS_TOP_K = 12
+
+# newest reviews embedded in the book detail payload
+BOOK_DETAIL_REVIEWS_LIMIT = 5
+
+# largest cart_items list a guest may post for pricing
+GUEST_CART_MAX_ITEMS = 100
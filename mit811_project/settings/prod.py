@@ -16,4 +16,13 @@ STATICFILES_DIRS = [
     STATIC_DIR,
 ]
 
-MEDIA_BASE_URL = 'https://backend.bookhive.us/'
\ No newline at end of file
+MEDIA_BASE_URL = 'https://backend.bookhive.us/'
+
+# The catalog's versioned response cache and its counters must be shared by
+# every worker process, a per-process memory cache would serve stale responses
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    }
+}
@@ -4,13 +4,20 @@ from django.contrib.auth.models import User
 from catalog.constants import PRODUCT_STATUS
 from user_profile.models import Address
 from django.utils import timezone
-from decimal import Decimal, ROUND_HALF_UP
-from django.db.models import Sum
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Sum, Prefetch, F, Case, When, Value
+from catalog.utils import product_images_prefetch
+from catalog.upsert import bulk_upsert
+from .pricing import PricedLine, price_cart, price_lines
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from .notifications import notify_buyer_on_order
 from django_pg.models import BaseOrder
 
+# Default of CartItem.get_discount_amount, None already means "no discount"
+NOT_RESOLVED = object()
+
 # Create your models here.
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -20,41 +27,118 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.user.username}"
 
+    @classmethod
+    def get_for_user(cls, user):
+        """ Return the user's cart with items, products and images loaded in bulk. """
+        items = CartItem.objects.select_related("product").prefetch_related(
+            product_images_prefetch("product__images")
+        )
+        cart, _ = cls.objects.prefetch_related(
+            Prefetch("cart_items", queryset=items)
+        ).get_or_create(user=user)
+        return cart
+
     def add_product(self, product_id, quantity=1):
-        """Add or update a product in the cart."""
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
+        """
+        Add `quantity` copies of a product with one upsert statement that
+        inserts the line or increments it in the database, so concurrent
+        adds never read the old quantity and cannot lose updates. On MySQL
+        the statement still takes next-key locks. Returns the updated line.
+        """
+        quantity = int(quantity)
+        if quantity < 1:
+            raise ValueError("Quantity must be at least 1.")
+        self._check_product(product_id)
+
+        table = connection.ops.quote_name(CartItem._meta.db_table)
+        if connection.vendor == "mysql":
+            conflict = "ON DUPLICATE KEY UPDATE quantity = quantity + %s"
+        else:
+            conflict = f"ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = {table}.quantity + %s"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (cart_id, product_id, quantity) VALUES (%s, %s, %s) {conflict}",
+                [self.pk, product_id, quantity, quantity],
+            )
+        return CartItem.objects.get(cart=self, product_id=product_id)
+
+    def set_quantity(self, product_id, quantity):
+        """ Set the quantity of a product, removing its line at 0. Returns the line or None. """
+        quantity = int(quantity)
+        if quantity < 0:
+            raise ValueError("Quantity cannot be negative.")
+        if quantity == 0:
+            self.remove_product(product_id)
+            return None
+        self._check_product(product_id)
+
+        # Insert or overwrite in one statement, like add_product
+        bulk_upsert(CartItem, [CartItem(cart=self, product_id=product_id, quantity=quantity)], ["cart", "product"], ["quantity"])
+        return CartItem.objects.get(cart=self, product_id=product_id)
+
+    def remove_product(self, product_id):
+        """ Delete the product's line, returns whether there was one. """
+        deleted, _ = CartItem.objects.filter(cart=self, product_id=product_id).delete()
+        return bool(deleted)
+
+    def clear(self):
+        CartItem.objects.filter(cart=self).delete()
+
+    def _check_product(self, product_id):
+        if not Product.objects.filter(id=product_id).exists():
             raise ValueError(f"Product with id {product_id} does not exist.")
 
-        cart_item, created = self.cart_items.get_or_create(product=product)
-
-        if not created:
-            cart_item.quantity += int(quantity)
-        else:
-            cart_item.quantity = int(quantity)
+    def merge_items(self, quantities):
+        """
+        Add {product_id: quantity} to the cart in one transaction: unknown
+        products are dropped with one query, missing lines are inserted empty
+        and every line is then incremented in the database by one UPDATE, so
+        concurrent merges neither duplicate lines nor lose quantities.
+        Returns the ids of the products merged.
+        """
+        with transaction.atomic():
+            product_ids = list(Product.objects.filter(id__in=list(quantities)).values_list('id', flat=True))
+            if not product_ids:
+                return []
+
+            CartItem.objects.bulk_create(
+                [CartItem(cart=self, product_id=product_id, quantity=0) for product_id in product_ids],
+                ignore_conflicts=True,
+            )
+            CartItem.objects.filter(cart=self, product_id__in=product_ids).update(
+                quantity=F('quantity') + Case(
+                    *[When(product_id=product_id, then=Value(quantities[product_id])) for product_id in product_ids],
+                    output_field=models.PositiveIntegerField(),
+                )
+            )
+        return product_ids
 
-        cart_item.save()
-        
     def get_total_price(self):
         """ Calculate total price without any discounts. """
         return sum(item.get_total_price() for item in self.cart_items.all())
 
     def get_total_discount(self):
         """ Calculate the total discount applied across all items in the cart. """
-        return sum(item.get_discount_amount() for item in self.cart_items.all())
+        return self.get_pricing().total_discount
 
     def get_total_discounted_price(self):
         """ Calculate total price after discount. """
-        total_price = self.get_total_price()
-        total_discount = self.get_total_discount()
-        return total_price - total_discount
+        return self.get_pricing().total_discounted_price
+
+    def get_pricing(self):
+        """ Price every line and the totals in one pass, see store.pricing. """
+        return price_cart(self)
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='cart_items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product')
+        ]
+
     def __str__(self):
         return f"{self.product.title} - {self.quantity}"
     
@@ -62,21 +146,15 @@ class CartItem(models.Model):
         """ Returns the total price for this item (quantity * price). """
         return self.product.price * self.quantity
 
-    def get_discount_amount(self):
-        """ Returns the discount amount for this item, based on active bulk discounts. """
-        # Check if the product has any active discounts
-        active_discount = self.product.bulk_discounts.filter(
-            start_date__lte=timezone.now(),
-            end_date__gte=timezone.now(),
-            min_quantity__lte=self.quantity  # Only apply discount if the cart quantity meets the min_quantity
-        ).first()
-
-        if active_discount:
-            discount_amount = (active_discount.discount_percentage / Decimal(100)) * self.product.price
-            total_discount = discount_amount * self.quantity
-            # Round the discount to 2 decimal places
-            return total_discount.quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
-        return Decimal(0).quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
+    def get_discount_amount(self, active_discount=NOT_RESOLVED):
+        """
+        Returns the discount amount for this item, based on active bulk discounts.
+        Pass the discount already resolved for the line to skip the lookup.
+        """
+        if active_discount is NOT_RESOLVED:
+            # Only applies if the cart quantity meets the discount's min_quantity
+            return price_lines([(self.product, self.quantity, self)]).lines[0].discount
+        return PricedLine(self.product, self.quantity, active_discount, self).discount
 
 class Order(BaseOrder):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -102,6 +180,13 @@ class Order(BaseOrder):
         self.total_price = total_price
         self.save()
 
+    def update_totals(self):
+        """ Refresh total_price and total_discount with one aggregate and one save. """
+        totals = self.order_items.aggregate(total_price=Sum('total'), total_discount=Sum('discount'))
+        self.total_price = totals['total_price'] or Decimal('0.00')
+        self.total_discount = totals['total_discount'] or Decimal('0.00')
+        self.save()
+
     def clean(self):
         # Check if payment_made is True before changing to specific statuses
         if self.status in ["Order Placed","Packed", "In Transit", "Delivered", "Completed"] and not self.payment_made:
@@ -155,29 +240,16 @@ class OrderItem(models.Model):
         # Always fetch the latest price from the related Product
         self.price = self.product.price
 
-        # Check if there is any valid discount
-        now = timezone.now()
-        valid_discount = self.product.bulk_discounts.filter(
-            start_date__lte=now,
-            end_date__gte=now,
-            min_quantity__lte=self.quantity
-        ).first()
-
-        if valid_discount:
-            print("there is a valid discount")
-            discount_amount = (valid_discount.discount_percentage / Decimal('100')) * (self.price * self.quantity)
-            self.discount = discount_amount
-        else:
-            self.discount = Decimal('0.00')
+        # Apply any valid discount with the order rule of the pricing engine
+        line = price_lines([(self.product, self.quantity, None)]).lines[0]
+        self.discount = line.order_discount
+        self.total = line.order_total
 
-        self.total = (self.quantity * self.price) - self.discount
-        
         # Save the OrderItem
         super(OrderItem, self).save(*args, **kwargs)
 
-        # Update the total_discount in the Order after saving the OrderItem
-        self.order.update_total_discount()
-        self.order.update_total_price()
+        # Update the totals in the Order after saving the OrderItem
+        self.order.update_totals()
     
     def __str__(self):
         return f"{self.product.title} - {self.quantity}"
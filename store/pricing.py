@@ -0,0 +1,61 @@
+from decimal import Decimal, ROUND_HALF_UP
+from catalog.discounts import resolve_discounts
+
+CENTS = Decimal('0.00')
+
+
+class PricedLine:
+    """ Prices of one basket line, computed with the cart and order discount rules. """
+
+    def __init__(self, product, quantity, discount=None, item=None):
+        self.product = product
+        self.quantity = quantity
+        self.item = item
+        self.active_discount = discount
+        self.unit_price = product.price
+        self.total_price = product.price * quantity
+
+        if discount:
+            percentage = discount.discount_percentage
+            # Cart rule: discount per unit times quantity, rounded half up to cents
+            self.discount = ((percentage / Decimal(100)) * product.price * quantity).quantize(CENTS, rounding=ROUND_HALF_UP)
+            # Order rule: discount on the line total, left for the DB column to round
+            self.order_discount = (percentage / Decimal('100')) * (product.price * quantity)
+        else:
+            self.discount = Decimal(0).quantize(CENTS, rounding=ROUND_HALF_UP)
+            self.order_discount = Decimal('0.00')
+
+        self.order_total = (quantity * product.price) - self.order_discount
+
+
+class PricingResult:
+    """ Priced lines plus the cart totals, computed in a single pass. """
+
+    def __init__(self, lines):
+        self.lines = lines
+        # sum() like the Cart.get_total_* methods, so an empty cart still totals to 0
+        self.total_price = sum(line.total_price for line in lines)
+        self.total_discount = sum(line.discount for line in lines)
+        self.total_discounted_price = self.total_price - self.total_discount
+        self._by_item = {line.item.pk: line for line in lines if line.item is not None}
+
+    def line_for_item(self, item):
+        return self._by_item.get(item.pk)
+
+
+def price_lines(entries, now=None):
+    """
+    Price (product, quantity, item) entries, resolving every discount with
+    one index lookup. `item` is the CartItem the line came from, or None.
+    """
+    entries = list(entries)
+    discounts = resolve_discounts([(product.id, quantity) for product, quantity, _ in entries], now)
+    return PricingResult([
+        PricedLine(product, quantity, discount, item)
+        for (product, quantity, item), discount in zip(entries, discounts)
+    ])
+
+
+def price_cart(cart, now=None):
+    """ Price a cart whose items and products are already loaded (see Cart.get_for_user). """
+    return price_lines(((item.product, item.quantity, item) for item in cart.cart_items.all()), now)
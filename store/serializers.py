@@ -1,19 +1,38 @@
 from rest_framework import serializers
 from .models import Cart, CartItem, ContactUs, Order, OrderItem, ShippingAddress, OrderNote
+from .pricing import price_lines
 from django.conf import settings
 
 class CartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.CharField(source='product.id')
     product_name = serializers.CharField(source='product.title')
     product_price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2)
+    get_total_price = serializers.SerializerMethodField(method_name='get_line_total')
+    get_discount_amount = serializers.SerializerMethodField(method_name='get_line_discount')
     images = serializers.SerializerMethodField()
 
     class Meta:
         model = CartItem
         fields = ['id', 'product_id', 'product_name', 'product_price', 'quantity', 'get_total_price', 'get_discount_amount', 'images']
 
+    def get_priced_line(self, obj):
+        """ The line from its cart's pricing in the context, or priced on its own. """
+        pricing = self.context.get('pricing', {}).get(obj.cart_id)
+        line = pricing.line_for_item(obj) if pricing else None
+        if line is None:
+            line = price_lines([(obj.product, obj.quantity, obj)]).lines[0]
+        return line
+
+    def get_line_total(self, obj):
+        return self.get_priced_line(obj).total_price
+
+    def get_line_discount(self, obj):
+        return self.get_priced_line(obj).discount
+
     def get_images(self, obj):
-        images = obj.product.images.all()
+        images = getattr(obj.product, 'prefetched_images', None)
+        if images is None:
+            images = obj.product.images.all()
         base_url = getattr(settings, 'MEDIA_BASE_URL', '')
         result = []
         for image in images:
@@ -36,14 +55,29 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = ['id', 'cart_items', 'total_price', 'total_discount', 'total_discounted_price']
 
+    def get_pricing(self, cart):
+        """
+        Price each cart once, the items and totals all read from the result.
+        Results are keyed by cart, so with many=True or a reused context
+        every cart still gets its own totals.
+        """
+        pricing = self.context.setdefault('pricing', {})
+        if cart.pk not in pricing:
+            pricing[cart.pk] = cart.get_pricing()
+        return pricing[cart.pk]
+
+    def to_representation(self, instance):
+        self.get_pricing(instance)
+        return super().to_representation(instance)
+
     def get_total_price(self, obj):
-        return obj.get_total_price()
+        return self.get_pricing(obj).total_price
 
     def get_total_discount(self, obj):
-        return obj.get_total_discount()
+        return self.get_pricing(obj).total_discount
 
     def get_total_discounted_price(self, obj):
-        return obj.get_total_discounted_price()
+        return self.get_pricing(obj).total_discounted_price
 
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -90,9 +124,19 @@ class OrderSerializer(serializers.ModelSerializer):
         # Set status to Pending
         order = Order.objects.create(user=user, status='Pending', **validated_data)
 
-        # Create order items
-        for item_data in order_items_data:
-            OrderItem.objects.create(order=order, **item_data)
+        # Price all items with one discount lookup and insert them together
+        pricing = price_lines((item['product'], item.get('quantity', 1), None) for item in order_items_data)
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=line.product,
+                quantity=line.quantity,
+                price=line.unit_price,
+                discount=line.order_discount,
+                total=line.order_total,
+            )
+            for line in pricing.lines
+        ])
 
         # Create shipping address
         ShippingAddress.objects.create(order=order, **shipping_data)
@@ -101,8 +145,7 @@ class OrderSerializer(serializers.ModelSerializer):
             OrderNote.objects.create(order=order, **note_data)
 
         # update totals before returning
-        order.update_total_price()
-        order.update_total_discount()
+        order.update_totals()
 
         return order
     
@@ -1,3 +1,347 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.db import connection, IntegrityError, OperationalError, transaction
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+import threading
+import time
+from rest_framework_simplejwt.tokens import RefreshToken
+from auth_core.testing import SignedRequestMixin
+from catalog.cache import get_cache
+from catalog.discounts import clear_discount_index
+from catalog.models import Product, Discount
+from catalog.testing import BookFactoryMixin
+from .models import Cart, CartItem, Order, OrderItem
+from .serializers import CartSerializer, OrderSerializer
 
-# Create your tests here.
+
+class StoreTestCase(SignedRequestMixin, BookFactoryMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="reader", password="secret-pass")
+        cls.api_key = cls.create_api_key()
+
+    def setUp(self):
+        get_cache().clear()
+        clear_discount_index()
+
+    def user_request(self, method, path, data=None):
+        token = str(RefreshToken.for_user(self.user).access_token)
+        return self.signed_request(method, path, data, HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    @classmethod
+    def add_discount(cls, book, min_quantity, percentage):
+        now = timezone.now()
+        return Discount.objects.create(
+            product=book, min_quantity=min_quantity, discount_percentage=Decimal(percentage),
+            start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+        )
+
+
+class CartDiscountTest(StoreTestCase):
+
+    def test_cart_discounts_resolve_without_per_line_queries(self):
+        cart = Cart.get_for_user(self.user)
+        for index in range(10):
+            book = self.create_book(index, price="9.99")
+            CartItem.objects.create(cart=cart, product=book, quantity=index + 1)
+            self.add_discount(book, 3, "12.5")
+
+        cart = Cart.get_for_user(self.user)
+        cart.get_total_discount()
+        with CaptureQueriesContext(connection) as ctx:
+            total = cart.get_total_discount()
+        # One signature check of the discount index, none per line
+        self.assertEqual(len(ctx.captured_queries), 1)
+        # 12.5% of 9.99 per book, rounded per line, for the 8 lines with 3+ copies
+        expected = sum(
+            (Decimal("0.125") * Decimal("9.99") * quantity).quantize(Decimal("0.00"))
+            for quantity in range(3, 11)
+        )
+        self.assertEqual(total, expected)
+
+
+class CartPricingTest(StoreTestCase):
+
+    def fill_cart(self, count):
+        cart = Cart.get_for_user(self.user)
+        for index in range(count):
+            book = self.create_book(index, price="7.35")
+            CartItem.objects.create(cart=cart, product=book, quantity=index + 1)
+            self.add_discount(book, 2, "17.5")
+        return Cart.get_for_user(self.user)
+
+    def serialize(self):
+        with CaptureQueriesContext(connection) as ctx:
+            cart = Cart.get_for_user(self.user)
+            data = CartSerializer(cart).data
+        return data, len(ctx.captured_queries)
+
+    def test_serialized_cart_matches_item_methods(self):
+        cart = self.fill_cart(6)
+        data, _ = self.serialize()
+
+        items = list(cart.cart_items.all())
+        self.assertEqual(
+            [(line["get_total_price"], line["get_discount_amount"]) for line in data["cart_items"]],
+            [(item.get_total_price(), item.get_discount_amount()) for item in items],
+        )
+        total_price = sum(item.get_total_price() for item in items)
+        total_discount = sum(item.get_discount_amount() for item in items)
+        self.assertEqual(data["total_price"], total_price)
+        self.assertEqual(data["total_discount"], total_discount)
+        self.assertEqual(data["total_discounted_price"], total_price - total_discount)
+
+    def test_serialized_cart_query_count_is_constant(self):
+        self.fill_cart(2)
+        self.serialize()
+        _, small = self.serialize()
+
+        CartItem.objects.all().delete()
+        Product.objects.all().delete()
+        self.fill_cart(12)
+        self.serialize()
+        _, large = self.serialize()
+        self.assertEqual(small, large)
+
+    def test_each_cart_gets_its_own_totals(self):
+        other_user = User.objects.create_user(username="other-reader", password="secret-pass")
+        carts = [Cart.objects.create(user=self.user), Cart.objects.create(user=other_user)]
+        for index, cart in enumerate(carts):
+            CartItem.objects.create(cart=cart, product=self.create_book(index, price=Decimal("4.00")), quantity=index + 1)
+
+        data = CartSerializer(carts, many=True).data
+        self.assertEqual([cart["total_price"] for cart in data], [Decimal("4.00"), Decimal("8.00")])
+        self.assertEqual([cart["cart_items"][0]["get_total_price"] for cart in data], [Decimal("4.00"), Decimal("8.00")])
+
+        context = {}
+        CartSerializer(carts[0], context=context).data
+        self.assertEqual(CartSerializer(carts[1], context=context).data["total_price"], Decimal("8.00"))
+
+    def test_empty_cart_totals(self):
+        data, _ = self.serialize()
+        self.assertEqual(data["cart_items"], [])
+        self.assertEqual((data["total_price"], data["total_discount"]), (0, 0))
+
+    def test_order_totals_match_item_saves(self):
+        books = [self.create_book(index, price=Decimal("3.33")) for index in range(4)]
+        for book in books:
+            self.add_discount(book, 2, "12.5")
+
+        request = RequestFactory().post("/")
+        request.user = self.user
+        serializer = OrderSerializer(
+            data={
+                "order_items": [{"product": book.id, "quantity": index + 1} for index, book in enumerate(books)],
+                "shipping_address": {
+                    "address": "1 Main Street", "state": "Lagos", "nearest_bus_stop": "Ikeja",
+                    "country": "Nigeria", "zip_code": "100001",
+                },
+            },
+            context={"request": request},
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        order = serializer.save()
+
+        expected = Order.objects.create(user=self.user, status="Pending")
+        for index, book in enumerate(books):
+            OrderItem.objects.create(order=expected, product=book, quantity=index + 1)
+        expected.refresh_from_db()
+        order.refresh_from_db()
+
+        self.assertEqual(
+            list(order.order_items.order_by("product_id").values_list("price", "discount", "total")),
+            list(expected.order_items.order_by("product_id").values_list("price", "discount", "total")),
+        )
+        self.assertEqual((order.total_price, order.total_discount), (expected.total_price, expected.total_discount))
+
+
+class GuestCartDetailTest(StoreTestCase):
+    path = "/api/cart/guest_cart_details/"
+
+    def post_cart(self, books, quantity=3):
+        return self.signed_post(
+            self.path, {"cart_items": [{"product_id": book.id, "quantity": quantity} for book in books]}
+        )
+
+    def test_lines_keep_the_response_format(self):
+        book = self.create_book(1, price=Decimal("12.50"))
+        self.add_discount(book, 3, "10")
+
+        response = self.signed_post(self.path, {"cart_items": [
+            {"product_id": book.id, "quantity": 3},
+            {"product_id": 999999, "quantity": 1},
+            {"product_id": "not-a-book"},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{
+            "product_id": book.id,
+            "product_name": "Book 1",
+            "product_price": "12.50",
+            "quantity": 3,
+            "get_total_price": 37.5,
+            "get_discount_amount": 3.75,
+            "images": [],
+        }])
+
+    def test_query_count_is_constant(self):
+        books = [self.create_book(index) for index in range(20)]
+        self.post_cart(books[:2])
+
+        with CaptureQueriesContext(connection) as small:
+            self.post_cart(books[:2])
+        with CaptureQueriesContext(connection) as large:
+            response = self.post_cart(books)
+        self.assertEqual(len(response.json()), 20)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    @override_settings(GUEST_CART_MAX_ITEMS=3)
+    def test_item_count_is_limited(self):
+        books = [self.create_book(index) for index in range(4)]
+        self.assertEqual(self.post_cart(books[:3]).status_code, 200)
+        self.assertEqual(self.post_cart(books).status_code, 400)
+
+
+class SyncCartTest(StoreTestCase):
+    path = "/api/cart/sync_cart/"
+
+    def sync(self, cart_items):
+        return self.user_request("post", self.path, {"cart_items": cart_items})
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list("product__title", "quantity"))
+
+    def test_sync_merges_quantities(self):
+        first, second = self.create_book(1), self.create_book(2)
+        CartItem.objects.create(cart=Cart.get_for_user(self.user), product=first, quantity=2)
+
+        response = self.sync([
+            {"product_id": first.id, "quantity": 3},
+            {"product_id": second.id},
+            {"product_id": second.id, "quantity": 4},
+            {"product_id": 999999, "quantity": 1},
+            {"product_id": "not-a-book"},
+        ])
+        self.assertEqual(response.json(), {"success": True})
+        self.assertEqual(self.quantities(), {"Book 1": 5, "Book 2": 5})
+
+    def test_query_count_is_constant(self):
+        books = [self.create_book(index) for index in range(30)]
+        self.sync([{"product_id": books[0].id}])
+
+        with CaptureQueriesContext(connection) as small:
+            self.sync([{"product_id": book.id} for book in books[:3]])
+        with CaptureQueriesContext(connection) as large:
+            self.sync([{"product_id": book.id} for book in books])
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(self.quantities()["Book 0"], 3)
+
+    def test_cart_lines_are_unique(self):
+        book = self.create_book(1)
+        cart = Cart.get_for_user(self.user)
+        CartItem.objects.create(cart=cart, product=book)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=cart, product=book)
+
+
+class CartMutationTest(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_book(1, price=Decimal("10.00"))
+        self.second = self.create_book(2, price=Decimal("4.00"))
+        self.add_discount(self.first, 3, "10")
+        self.cart = Cart.get_for_user(self.user)
+        CartItem.objects.create(cart=self.cart, product=self.second, quantity=2)
+
+    def test_add_returns_the_changed_line_and_totals(self):
+        self.user_request("post", "/api/cart/add_to_cart/", {"product_id": self.first.id, "quantity": 2})
+        response = self.user_request("post", "/api/cart/add_to_cart/", {"product_id": self.first.id})
+
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["cart_item"]["product_id"], str(self.first.id))
+        self.assertEqual(data["cart_item"]["quantity"], 3)
+        self.assertEqual(data["cart_item"]["get_discount_amount"], 3.0)
+        self.assertEqual(
+            (data["total_price"], data["total_discount"], data["total_discounted_price"]), (38.0, 3.0, 35.0)
+        )
+
+    def test_add_rejects_unknown_products_and_bad_quantities(self):
+        response = self.user_request("post", "/api/cart/add_to_cart/", {"product_id": 999999})
+        self.assertEqual(response.status_code, 400)
+        response = self.user_request("post", "/api/cart/add_to_cart/", {"product_id": self.first.id, "quantity": 0})
+        self.assertEqual(response.status_code, 400)
+        response = self.user_request("post", "/api/cart/add_to_cart/", {"product_id": self.first.id, "quantity": "two"})
+        self.assertEqual(response.json(), {"error": "quantity must be a whole number"})
+        self.assertFalse(CartItem.objects.filter(product=self.first).exists())
+
+    def test_set_quantity(self):
+        path = f"/api/cart/update_cart_item/{self.second.id}/"
+        data = self.user_request("put", path, {"quantity": 5}).json()
+        self.assertEqual(data["cart_item"]["quantity"], 5)
+        self.assertEqual(data["total_price"], 20.0)
+
+        data = self.user_request("put", path, {"quantity": 0}).json()
+        self.assertIsNone(data["cart_item"])
+        self.assertEqual(data["total_price"], 0)
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_remove_and_clear(self):
+        CartItem.objects.create(cart=self.cart, product=self.first, quantity=1)
+        path = f"/api/cart/delete_cart_item/{self.second.id}/"
+        data = self.user_request("delete", path).json()
+        self.assertEqual(data["detail"], "Cart item deleted successfully.")
+        self.assertEqual(data["total_price"], 10.0)
+        self.assertEqual(self.user_request("delete", path).status_code, 404)
+
+        data = self.user_request("delete", "/api/cart/clear_cart/").json()
+        self.assertEqual((data["cart_item"], data["total_price"]), (None, 0))
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+
+class CartContentionTest(TransactionTestCase):
+
+    def test_parallel_adds_lose_no_updates(self):
+        user = User.objects.create_user(username="reader", password="secret-pass")
+        book = StoreTestCase.create_book(1)
+        cart = Cart.get_for_user(user)
+        threads, adds, errors = 8, 10, []
+        barrier = threading.Barrier(threads)
+
+        def add_copy():
+            for attempt in range(1000):
+                try:
+                    return cart.add_product(book.id, 1)
+                except OperationalError as exc:
+                    # SQLite's shared in-memory test database rejects a concurrent writer
+                    # instead of queueing it, and the statement did not run. Any other
+                    # error, a MySQL deadlock included, fails the test.
+                    if connection.vendor != "sqlite" or "database table is locked" not in str(exc):
+                        raise
+                    time.sleep(0.001)
+            raise AssertionError("SQLite table stayed locked")
+
+        def add_copies():
+            try:
+                barrier.wait()
+                for _ in range(adds):
+                    add_copy()
+            except Exception as exc:
+                # Any failed add is a lost update, deadlocks included
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=add_copies) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 1)
+        self.assertEqual(CartItem.objects.get(cart=cart).quantity, threads * adds)
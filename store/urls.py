@@ -4,6 +4,8 @@ from .views import (
     AddToCartView, 
     SyncCartView, 
     CartItemDeleteView, 
+    CartItemQuantityView,
+    ClearCartView,
     GuestCartDetailView, 
     ContactUsCreateView, 
     OrderCreateView,
@@ -17,6 +19,8 @@ urlpatterns = [
     path('api/cart/guest_cart_details/', GuestCartDetailView.as_view(), name='guest_cart_details'),
     path('api/cart/sync_cart/', SyncCartView.as_view(), name='get_user_cart'),
     path('api/cart/delete_cart_item/<int:product_id>/', CartItemDeleteView.as_view(), name='delete_cart_item'),
+    path('api/cart/update_cart_item/<int:product_id>/', CartItemQuantityView.as_view(), name='update_cart_item'),
+    path('api/cart/clear_cart/', ClearCartView.as_view(), name='clear_cart'),
     path('api/orders/create/', OrderCreateView.as_view(), name='create_order'),
     path('api/contact_us/', ContactUsCreateView.as_view(), name='contact_us'),
     path("api/verify/<int:order_id>/<str:payment_method>/", CustomPaymentVerificationJSONView.as_view(), name="payment-verification-json"),
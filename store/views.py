@@ -2,9 +2,12 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
 from .models import Cart, CartItem, Order
-from .serializers import CartSerializer, ContactUsSerializer, OrderSerializer
+from .serializers import CartSerializer, CartItemSerializer, ContactUsSerializer, OrderSerializer
+from .pricing import price_lines
 from auth_core.views import PrivateUserViewMixin, PublicViewMixin
 from catalog.views import Product
+from catalog.utils import product_images_prefetch
+from django.conf import settings
 from django_pg.views import PaymentVerificationJSONView
 from django.views import View
 from django.http import JsonResponse, Http404, HttpResponseRedirect
@@ -12,7 +15,7 @@ from django.http import JsonResponse, Http404, HttpResponseRedirect
 
 class GetUserCartView(PrivateUserViewMixin, APIView):
     def get(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        cart = Cart.get_for_user(request.user)
         serializer = CartSerializer(cart, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -23,48 +26,106 @@ class GuestCartDetailView(PublicViewMixin, APIView):
         if not isinstance(items, list):
             return Response({'error': 'Invalid format'}, status=400)
 
-        response_data = []
-        for item in items:
-            product_id = item.get('product_id')
-            quantity = int(item.get('quantity', 1))
+        max_items = getattr(settings, 'GUEST_CART_MAX_ITEMS', 100)
+        if len(items) > max_items:
+            return Response({'error': f'A cart can hold at most {max_items} items'}, status=400)
 
+        entries = []
+        for item in items:
             try:
-                product = Product.objects.get(id=product_id)
-                price = float(product.price)
-
-                images = product.images.all()
-                image_urls = [
-                    request.build_absolute_uri(img.image.url) for img in images if img.image
-                ]
-
-                response_data.append({
-                    'product_id': product.id,
-                    'product_name': product.title,
-                    'product_price': f"{price:.2f}",
-                    'quantity': quantity,
-                    'get_total_price': round(price * quantity, 2),
-                    'images': image_urls
-                })
-            except Product.DoesNotExist:
-                continue
+                entries.append((int(item.get('product_id')), int(item.get('quantity', 1))))
+            except (AttributeError, TypeError, ValueError):
+                continue  # Skip malformed items like unknown products
+
+        # One query for the products and one for their images, whatever the cart size
+        products = Product.objects.prefetch_related(product_images_prefetch()).in_bulk(
+            {product_id for product_id, _ in entries}
+        )
+        entries = [(products[product_id], quantity, None) for product_id, quantity in entries if product_id in products]
+        pricing = price_lines(entries)
+
+        response_data = []
+        for line in pricing.lines:
+            product = line.product
+            price = float(product.price)
+            image_urls = [
+                request.build_absolute_uri(img.image.url) for img in product.prefetched_images if img.image
+            ]
+
+            response_data.append({
+                'product_id': product.id,
+                'product_name': product.title,
+                'product_price': f"{price:.2f}",
+                'quantity': line.quantity,
+                'get_total_price': round(price * line.quantity, 2),
+                'get_discount_amount': line.discount,
+                'images': image_urls
+            })
 
         return Response(response_data)
        
+def cart_change_response(request, cart, product_id, **extra):
+    """
+    Respond to a cart mutation with the changed line (None once removed)
+    and the recalculated cart totals, instead of the whole cart.
+    """
+    items = list(cart.cart_items.select_related('product'))
+    pricing = price_lines((item.product, item.quantity, item) for item in items)
+    changed = next((item for item in items if item.product_id == product_id), None)
+    context = {'request': request, 'pricing': {cart.pk: pricing}}
+    return Response({
+        **extra,
+        'id': cart.id,
+        'cart_item': CartItemSerializer(changed, context=context).data if changed else None,
+        'total_price': pricing.total_price,
+        'total_discount': pricing.total_discount,
+        'total_discounted_price': pricing.total_discounted_price,
+    }, status=status.HTTP_200_OK)
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
 class AddToCartView(PrivateUserViewMixin, APIView):
     def post(self, request):
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        product_id = request.data.get('product_id')
-        quantity = request.data.get('quantity', 1)
+        product_id = parse_int(request.data.get('product_id'))
+        quantity = parse_int(request.data.get('quantity', 1))
 
         if not product_id:
             return Response({'error': 'product_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity is None:
+            return Response({'error': 'quantity must be a whole number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            cart.add_product(product_id, quantity)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # This method should be implemented in your Cart model
-        cart.add_product(product_id, quantity)  
-        cart.save()
+        return cart_change_response(request, cart, product_id)
 
-        serializer = CartSerializer(cart)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+class CartItemQuantityView(PrivateUserViewMixin, APIView):
+    def put(self, request, product_id):
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        quantity = parse_int(request.data.get('quantity'))
+
+        if quantity is None:
+            return Response({'error': 'quantity is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            cart.set_quantity(product_id, quantity)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return cart_change_response(request, cart, product_id)
+
+class ClearCartView(PrivateUserViewMixin, APIView):
+    def delete(self, request):
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        cart.clear()
+        return cart_change_response(request, cart, None, detail="Cart cleared successfully.")
 
 class SyncCartView(PrivateUserViewMixin, APIView):
     def post(self, request):
@@ -73,34 +134,31 @@ class SyncCartView(PrivateUserViewMixin, APIView):
         if not isinstance(cart_items, list):
             return Response({'success': False, 'error': 'Invalid data format'}, status=400)
 
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-
+        # Sum repeated products first, as adding them one by one would
+        quantities = {}
         for item in cart_items:
-            product_id = item.get('product_id')
-            quantity = item.get('quantity', 1)
-
             try:
-                product = Product.objects.get(id=product_id)
-                cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-                if not created:
-                    cart_item.quantity += quantity
-                else:
-                    cart_item.quantity = quantity
-                cart_item.save()
-            except Product.DoesNotExist:
-                continue  # Skip invalid product
+                product_id = int(item.get('product_id'))
+                quantity = int(item.get('quantity', 1))
+            except (AttributeError, TypeError, ValueError):
+                continue  # Skip invalid items like invalid products
+            if quantity > 0:
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        # Invalid products are skipped inside the merge
+        cart.merge_items(quantities)
 
         return Response({'success': True})
 
 class CartItemDeleteView(PrivateUserViewMixin, APIView):
     def delete(self, request, product_id):
-        cart_item = CartItem.objects.filter(cart__user=request.user, product=product_id).first()
+        cart = Cart.objects.filter(user=request.user).first()
 
-        if not cart_item:
+        if not cart or not cart.remove_product(product_id):
             return Response({"error": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        cart_item.delete()
-        return Response({"detail": "Cart item deleted successfully."}, status=status.HTTP_200_OK)
+        return cart_change_response(request, cart, product_id, detail="Cart item deleted successfully.")
 
 class OrderCreateView(PrivateUserViewMixin, APIView):
     def post(self, request):
@@ -1,3 +1,46 @@
 from django.test import TestCase
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.tokens import RefreshToken
+from auth_core.testing import SignedRequestMixin
+from .models import BillingAddress
 
-# Create your tests here.
+
+class UserProfileConditionalGetTest(SignedRequestMixin, TestCase):
+
+    def setUp(self):
+        self.api_key = self.create_api_key()
+        self.user = User.objects.create_user(username="reader", password="secret-pass")
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def get_profile(self, **headers):
+        return self.signed_get("/api/user/profile/", HTTP_AUTHORIZATION=f"Bearer {self.token}", **headers)
+
+    def test_etag_and_last_modified(self):
+        response = self.get_profile()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        self.assertEqual(self.get_profile(HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(
+            self.get_profile(HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304
+        )
+
+    def test_etag_varies_with_the_rendered_format(self):
+        response = self.get_profile(HTTP_ACCEPT="application/json")
+        self.assertIn("Accept", response["Vary"])
+        browsable = self.get_profile(HTTP_ACCEPT="text/html", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(browsable.status_code, 200)
+        self.assertNotEqual(browsable["ETag"], response["ETag"])
+        self.assertIn("Accept", self.get_profile(HTTP_IF_NONE_MATCH=response["ETag"])["Vary"])
+
+    def test_changes_invalidate_etag(self):
+        etag = self.get_profile()["ETag"]
+        self.user.first_name = "Ada"
+        self.user.save()
+        self.assertEqual(self.get_profile(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.get_profile()["ETag"]
+        billing = BillingAddress.objects.get(user=self.user)
+        billing.address = "1 New Road"
+        billing.save()
+        self.assertEqual(self.get_profile(HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -1,6 +1,6 @@
 from rest_framework.response import Response
 from rest_framework import status
-from .models import BillingAddress
+from .models import BillingAddress, Profile
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from .serializers import BillingAddressSerializer
@@ -12,12 +12,33 @@ from django.contrib.auth.hashers import make_password
 from django.shortcuts import get_object_or_404
 from .utils import generate_password_reset_token, is_password_reset_token_valid
 from .signals import send_password_reset_email
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+import hashlib
 
 class UserProfileView(PrivateUserViewMixin, APIView):
     def get(self, request):
         user = request.user
         billing = getattr(user, 'billing_address', None)
 
+        # Profile.updated_on moves on every User save (see signals), billing has its own
+        timestamps = [
+            Profile.objects.filter(user=user).values_list("updated_on", flat=True).first(),
+            billing.updated_on if billing else None,
+        ]
+        last_modified = max((ts for ts in timestamps if ts), default=None)
+        # JSON and msgpack bodies of the same profile need different ETags
+        renderer_format = request.accepted_renderer.format
+        etag = '"%s"' % hashlib.sha1(
+            f"{user.pk}:{renderer_format}:{last_modified.isoformat() if last_modified else ''}".encode()
+        ).hexdigest()
+        last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+        if not_modified is not None:
+            patch_vary_headers(not_modified, ["Accept"])
+            return not_modified
+
         billing_data = None
         if billing:
             billing_data = {
@@ -29,13 +50,18 @@ class UserProfileView(PrivateUserViewMixin, APIView):
                 "is_verified": billing.is_verified,
             }
 
-        return Response({
+        response = Response({
             "username": user.username,
             "email": user.email,
             "first_name": user.first_name,
             "last_name": user.last_name,
             "billing_address": billing_data
         })
+        response["ETag"] = etag
+        if last_modified_ts:
+            response["Last-Modified"] = http_date(last_modified_ts)
+        patch_vary_headers(response, ["Accept"])
+        return response
     
 class BillingAddressView(APIView):
     permission_classes = [IsAuthenticated]